@@ -0,0 +1,59 @@
+"""Micro-benchmark for the per-file setup cost of regex-based tasks.
+
+Each task is run on a one-line file, so the measured time is dominated by the
+work a task does before it starts matching (e.g., building and compiling its
+regexes). Run it from the wpiformat directory with:
+
+    python -m test.benchmark_regex_setup
+"""
+
+import functools
+import os
+import subprocess
+import timeit
+from pathlib import Path
+
+from wpiformat.bracecomment import BraceComment
+from wpiformat.cidentlist import CIdentList
+from wpiformat.config import Config
+from wpiformat.javaclass import JavaClass
+from wpiformat.jni import Jni
+from wpiformat.licenseupdate import LicenseUpdate
+from wpiformat.usingdeclaration import UsingDeclaration
+from wpiformat.usingnamespacestd import UsingNamespaceStd
+
+from .test_tasktest import OpenTemporaryDirectory
+
+ITERATIONS = 20000
+
+
+def main():
+    with OpenTemporaryDirectory():
+        subprocess.check_call(["git", "init", "-q"])
+        Path(".wpiformat-license").write_text(
+            "// Copyright (c) {year} Company Name. All Rights Reserved.\n"
+        )
+        config_file = Config(Path.cwd(), Path(".wpiformat"))
+
+        lines = "int x;" + os.linesep
+        for task, filename in [
+            (BraceComment(), "Test.cpp"),
+            (CIdentList(), "Test.c"),
+            (JavaClass(), "Test.java"),
+            (Jni(), "Test.cpp"),
+            (LicenseUpdate({}), "Test.cpp"),
+            (UsingDeclaration(), "Test.hpp"),
+            (UsingNamespaceStd(), "Test.cpp"),
+        ]:
+            filename = Path(filename).resolve()
+            seconds = timeit.timeit(
+                functools.partial(task.run_pipeline, config_file, filename, lines),
+                number=ITERATIONS,
+            )
+            print(
+                f"{type(task).__name__:>20}: {seconds / ITERATIONS * 1e6:6.2f} us/file"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+from pathlib import Path
+
+from wpiformat.cache import Cache, hash_contents
+
+from .test_tasktest import OpenTemporaryDirectory
+
+
+def test_cache():
+    with OpenTemporaryDirectory():
+        filename = Path("cache.json").resolve()
+
+        # Missing cache file is treated as empty
+        cache = Cache(filename, "env")
+        assert cache.get("foo") is None
+
+        cache.set("foo", ["bar", ""])
+        assert cache.get("foo") == ["bar", ""]
+        cache.save()
+
+        # Entries persist between runs
+        cache = Cache(filename, "env")
+        assert cache.get("foo") == ["bar", ""]
+
+        # Worker updates are merged into the parent's cache
+        worker_cache = Cache(filename, "env")
+        worker_cache.set("baz", ["qux", "warning\n"])
+        cache.merge(worker_cache.pop_updates())
+        assert not worker_cache.pop_updates()
+        cache.save()
+        assert Cache(filename, "env").get("baz") == ["qux", "warning\n"]
+
+        # Entries are discarded if the environment changed
+        assert Cache(filename, "other env").get("foo") is None
+
+        # Corrupt cache files are treated as empty
+        filename.write_text("{")
+        assert Cache(filename, "env").get("foo") is None
+
+
+def test_hash_contents():
+    assert hash_contents("ab", "c") != hash_contents("a", "bc")
+    assert hash_contents("abc") == hash_contents(b"abc")
@@ -0,0 +1,35 @@
+import subprocess
+from pathlib import Path
+
+from wpiformat.clangformat import ClangFormat
+from wpiformat.config import Config
+
+from .test_tasktest import OpenTemporaryDirectory
+
+
+def test_clangformat_batch():
+    with OpenTemporaryDirectory():
+        subprocess.check_call(["git", "init", "-q"])
+        Path("a").mkdir()
+        Path("b").mkdir()
+        Path(".clang-format").write_text("BasedOnStyle: Google\n")
+        Path("b/.clang-format").write_text("BasedOnStyle: LLVM\nIndentWidth: 8\n")
+
+        config_file = Config.get(Path.cwd())
+        lines = "int  main() {\nint x = 0;\nreturn x;\n}\n"
+
+        # Files with the same name in directories with different styles
+        files = [
+            (config_file, Path("a/Test.cpp").resolve(), lines),
+            (config_file, Path("b/Test.cpp").resolve(), lines),
+            (config_file, Path("Test.cpp").resolve(), lines),
+        ]
+
+        task = ClangFormat()
+        expected = [task.run_pipeline(*file) for file in files]
+        assert expected[0] == ("int main() {\n  int x = 0;\n  return x;\n}\n", True)
+        assert expected[1] == (
+            "int main() {\n        int x = 0;\n        return x;\n}\n",
+            True,
+        )
+        assert task.run_pipeline_batch(files) == expected
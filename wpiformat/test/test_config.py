@@ -35,3 +35,44 @@ modifiableFileExclude {
         assert not config_file.is_modifiable_file(
             Path("./wpiformat/license.txt").resolve()
         )
+
+
+def test_config_get():
+    with OpenTemporaryDirectory():
+        subprocess.check_call(["git", "init", "-q"])
+        Path("a/b").mkdir(parents=True)
+        Path("c").mkdir()
+        Path(".wpiformat").write_text("generatedFileExclude {\n  root\n}\n")
+        Path("a/.styleguide").write_text("generatedFileExclude {\n  a\n}\n")
+        Path("c/.wpiformat").write_text("generatedFileExclude {\n  c\n}\n")
+
+        # A .wpiformat file in a parent directory takes precedence over a
+        # deprecated .styleguide file
+        config_file = Config.get(Path("a/b").resolve())
+        assert config_file.filename == Path(".wpiformat").resolve()
+        assert config_file.is_generated_file(Path("root"))
+
+        # Directories using the same config file share a Config object
+        assert Config.get(Path("a").resolve()) is config_file
+        assert Config.get(Path.cwd()) is config_file
+
+        config_file = Config.get(Path("c").resolve())
+        assert config_file.filename == Path("c/.wpiformat").resolve()
+        assert config_file.is_generated_file(Path("c"))
+
+
+def test_config_read_file_chain():
+    with OpenTemporaryDirectory():
+        subprocess.check_call(["git", "init", "-q"])
+        Path("a/b").mkdir(parents=True)
+        Path("CPPLINT.cfg").write_text("set noparent\n")
+        Path("a/b/CPPLINT.cfg").write_text("filter=-build\n")
+
+        # Files in parent directories come first
+        contents = Config.read_file_chain(Path("a/b").resolve(), "CPPLINT.cfg")
+        assert contents[-4:] == [
+            Path("CPPLINT.cfg").resolve().as_posix(),
+            "set noparent\n",
+            Path("a/b/CPPLINT.cfg").resolve().as_posix(),
+            "filter=-build\n",
+        ]
@@ -0,0 +1,78 @@
+from pathlib import Path
+
+from wpiformat.cache import Cache
+from wpiformat.includegraph import IncludeGraph
+
+
+def test_includegraph(tmp_path):
+    files = {
+        "include/wpi/a.h": '#pragma once\n#include "wpi/b.h"\n',
+        "include/wpi/b.h": "#pragma once\n",
+        "include/wpi/c.h": "#pragma once\n",
+        "include/other/b.h": "#pragma once\n",
+        "src/a.cpp": '#include "wpi/a.h"\n',
+        "src/ab.cpp": '#include <wpi/a.h>\n  #  include "../include/wpi/b.h"\n',
+        "src/b.cpp": '#include "wpi/b.h"\n// #include "wpi/c.h"\n',
+    }
+    for name, contents in files.items():
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text(contents)
+    filenames = [tmp_path / name for name in files]
+
+    def path(name: str) -> Path:
+        return tmp_path / name
+
+    cache = Cache(None, "")
+    include_graph = IncludeGraph(filenames, cache)
+
+    # Include names are resolved by path suffix and relative to the includer
+    assert include_graph.includes[path("src/ab.cpp")] == {
+        path("include/wpi/a.h"),
+        path("include/wpi/b.h"),
+    }
+    assert include_graph.get_transitive_includers(path("include/wpi/b.h")) == {
+        path("include/wpi/a.h"),
+        path("src/a.cpp"),
+        path("src/ab.cpp"),
+        path("src/b.cpp"),
+    }
+
+    # One source file covers both headers, and c.h is only in a comment
+    sources = {path("src/a.cpp"), path("src/ab.cpp"), path("src/b.cpp")}
+    assert include_graph.get_covering_sources(
+        [path("include/wpi/a.h"), path("include/wpi/b.h"), path("include/wpi/c.h")],
+        sources,
+    ) == ({path("src/a.cpp")}, {path("include/wpi/c.h")})
+
+    # Unmodified files are scanned from the cache
+    assert len(cache.entries) == len(files)
+    cached_graph = IncludeGraph(filenames, cache)
+    assert cached_graph.includes == include_graph.includes
+
+
+def test_includegraph_external_includes(tmp_path):
+    files = {
+        "src/a.cpp": '#include "a.h"\n#include <vector>\n',
+        "src/a.h": '#include "generated/config.h"\n',
+        "build/generated/config.h": '#include "version.h"\n',
+        "build/generated/version.h": "",
+    }
+    for name, contents in files.items():
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text(contents)
+
+    # Generated headers in the build tree aren't scanned
+    include_graph = IncludeGraph([tmp_path / "src/a.cpp", tmp_path / "src/a.h"])
+    assert include_graph.unresolved == {
+        tmp_path / "src/a.cpp": {"vector"},
+        tmp_path / "src/a.h": {"generated/config.h"},
+    }
+
+    # They're found in the include directories, along with their includes
+    assert include_graph.get_external_includes(
+        tmp_path / "src/a.cpp", [tmp_path / "build"]
+    ) == {
+        ("vector", None),
+        ("generated/config.h", tmp_path / "build/generated/config.h"),
+        ("version.h", tmp_path / "build/generated/version.h"),
+    }
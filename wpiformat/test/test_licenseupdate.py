@@ -366,3 +366,38 @@ change
 
 """
         )
+
+
+def test_licenseupdate_last_years():
+    with OpenTemporaryDirectory():
+        init_repo()
+
+        Path("Committed.cpp").write_text("")
+        Path("Modified.cpp").write_text("")
+        subprocess.check_call(["git", "add", "Committed.cpp", "Modified.cpp"])
+        subprocess.check_call(
+            ["git", "commit", "-q", "-m", "Initial commit"],
+            env={
+                **os.environ,
+                "GIT_AUTHOR_DATE": "2017-01-01T00:00:00",
+                "GIT_COMMITTER_DATE": "2017-01-01T00:00:00",
+            },
+        )
+        Path("Modified.cpp").write_text("int x;")
+        Path("Untracked.cpp").write_text("")
+
+        repo_root = Path.cwd().resolve()
+        year = str(date.today().year)
+
+        assert LicenseUpdate.get_last_years(
+            repo_root,
+            [
+                repo_root / "Committed.cpp",
+                repo_root / "Modified.cpp",
+                repo_root / "Untracked.cpp",
+            ],
+        ) == {
+            "Committed.cpp": "2017",
+            "Modified.cpp": year,
+            "Untracked.cpp": year,
+        }
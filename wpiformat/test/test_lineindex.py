@@ -0,0 +1,20 @@
+from wpiformat.lineindex import LineIndex
+
+
+def test_lineindex():
+    lines = "first\r\nsecond\r\n\r\nfourth"
+    line_index = LineIndex(lines)
+
+    assert line_index.line_number(0) == 1
+    assert line_index.line_number(lines.index("\r\nsecond")) == 1
+    assert line_index.line_number(lines.index("second")) == 2
+    assert line_index.line_number(lines.index("fourth")) == 4
+    assert line_index.line_number(len(lines)) == 4
+
+    assert line_index.line(1) == "first"
+    assert line_index.line(2) == "second"
+    assert line_index.line(3) == ""
+    assert line_index.line(4) == "fourth"
+
+    # LineIndex is reused for unmodified contents
+    assert LineIndex.get(lines) is LineIndex.get(lines[:])
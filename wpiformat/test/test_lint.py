@@ -0,0 +1,32 @@
+import subprocess
+from pathlib import Path
+
+from wpiformat.cache import Cache
+from wpiformat.config import Config
+from wpiformat.lint import Lint
+
+from .test_tasktest import OpenTemporaryDirectory
+
+
+def test_lint(capsys):
+    with OpenTemporaryDirectory():
+        subprocess.check_call(["git", "init", "-q"])
+        filename = Path("Test.cpp").resolve()
+        config_file = Config.get(filename.parent)
+
+        cache = Cache(None, "")
+        task = Lint(cache)
+
+        lines = "int main() {\n  long x = 0;\n  return x;\n}\n"
+        assert task.run_pipeline(config_file, filename, lines) == (lines, False)
+        errors = capsys.readouterr().err
+        assert f"{filename.as_posix()}:2:  Use int16_t/int64_t/etc" in errors
+
+        # Unmodified contents replay the cached result
+        assert cache.get(filename.as_posix())[1:] == [errors, False]
+        assert task.run_pipeline(config_file, filename, lines) == (lines, False)
+        assert capsys.readouterr().err == errors
+
+        lines = "int main() {\n  int x = 0;\n  return x;\n}\n"
+        assert task.run_pipeline(config_file, filename, lines) == (lines, True)
+        assert capsys.readouterr().err == ""
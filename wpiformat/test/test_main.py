@@ -1,9 +1,16 @@
+import multiprocessing as mp
+import subprocess
 import sys
+import threading
 from typing import ClassVar
 
 import pytest
 
 import wpiformat
+from wpiformat.cache import Cache
+from wpiformat.includegraph import IncludeGraph
+from wpiformat.task import PipelineTask, StandaloneTask
+from wpiformat.tokenizer import Tokenizer
 
 
 class SynchronousPool:
@@ -22,10 +29,20 @@ class SynchronousPool:
         self.callbacks.append(callback.__name__)
         return [callback(item) for item in iterable]
 
+    def imap_unordered(self, callback, iterable):
+        self.callbacks.append(callback.__name__)
+        for item in iterable:
+            yield callback(item)
+
+    def terminate(self):
+        self.callbacks.append("terminate")
+
 
 def test_main_continues_after_non_utf8_file(monkeypatch, tmp_path, capsys):
+    # Larger files are processed first, so the invalid file is made larger to
+    # check that the files after it are still processed
     invalid_filename = tmp_path / "foo"
-    invalid_filename.write_bytes(b"\xff")
+    invalid_filename.write_bytes(b"\xff" * 64)
 
     warning_filename = tmp_path / "warning.cpp"
     warning_filename.write_text("using namespace std;\n")
@@ -65,4 +82,305 @@ def test_main_continues_after_non_utf8_file(monkeypatch, tmp_path, capsys):
     invalid_file_error = f"error: {invalid_filename} contains characters not in UTF-8"
     warning = f'warning: {warning_filename}: 1: avoid "using namespace std;"'
     assert output.index(invalid_file_error) < output.index(warning)
-    assert SynchronousPool.callbacks == ["_proc_pipeline", "_proc_batch"]
+    assert SynchronousPool.callbacks == ["_proc_pipeline"]
+
+
+def test_list_unignored_files(tmp_path):
+    subprocess.check_call(["git", "init", "-q"], cwd=tmp_path)
+    (tmp_path / ".gitignore").write_text("build/\n")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "ignored.cpp").write_text("")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "tracked.cpp").write_text("")
+    (tmp_path / "src" / "untracked file.cpp").write_text("")
+    subprocess.check_call(["git", "add", "src/tracked.cpp"], cwd=tmp_path)
+
+    # Tracked files which match .gitignore are skipped
+    (tmp_path / ".gitignore").write_text("build/\n*.gen.cpp\n")
+    (tmp_path / "src" / "forced.gen.cpp").write_text("")
+    subprocess.check_call(["git", "add", "-f", "src/forced.gen.cpp"], cwd=tmp_path)
+
+    # Tracked file deleted from working tree
+    (tmp_path / "src" / "deleted.cpp").write_text("")
+    subprocess.check_call(["git", "add", "src/deleted.cpp"], cwd=tmp_path)
+    (tmp_path / "src" / "deleted.cpp").unlink()
+
+    assert sorted(wpiformat._list_unignored_files(tmp_path)) == [
+        tmp_path / ".gitignore",
+        tmp_path / "src" / "tracked.cpp",
+        tmp_path / "src" / "untracked file.cpp",
+    ]
+    assert sorted(wpiformat._list_unignored_files(tmp_path / "src")) == [
+        tmp_path / "src" / "tracked.cpp",
+        tmp_path / "src" / "untracked file.cpp",
+    ]
+
+
+def test_partition_by_cost(tmp_path):
+    sizes = {"a": 50, "b": 40, "c": 30, "d": 20, "e": 10}
+    for name, size in sizes.items():
+        (tmp_path / name).write_text("x" * size)
+    filenames = [tmp_path / name for name in sizes]
+
+    batches = wpiformat._partition_by_cost(filenames, 2)
+    assert [[f.name for f in batch] for batch in batches] == [
+        ["a", "d", "e"],
+        ["b", "c"],
+    ]
+
+    # No empty batches are created for fewer files than batches
+    assert len(wpiformat._partition_by_cost(filenames[:1], 4)) == 1
+
+
+def test_partition_by_cost_spreads_suffixes(tmp_path):
+    sizes = {"a.cpp": 6, "b.cpp": 2, "c.cpp": 2, "d.py": 5, "e.py": 5}
+    for name, size in sizes.items():
+        (tmp_path / name).write_text("x" * size)
+    filenames = [tmp_path / name for name in sizes]
+
+    # Sorting by cost alone puts all the .py files in one batch
+    batches = wpiformat._partition_by_cost(filenames, 2)
+    assert [{f.suffix for f in batch} for batch in batches] == [{".cpp"}, {".py"}]
+
+    batches = wpiformat._partition_by_cost(filenames, 2, spread_suffixes=True)
+    assert [{f.suffix for f in batch} for batch in batches] == [
+        {".cpp", ".py"},
+        {".cpp", ".py"},
+    ]
+
+
+def test_get_costs_uses_timing_history(tmp_path):
+    filenames = [tmp_path / "a", tmp_path / "b", tmp_path / "c"]
+    for filename, size in zip(filenames, [100, 10, 50]):
+        filename.write_text("x" * size)
+
+    timings = Cache(None, "")
+    timings.set(f"pipeline:{filenames[1].as_posix()}", {"A": 1.0, "B": 2.0})
+    timings.set(f"pipeline:{filenames[2].as_posix()}", {"A": 0.5})
+    wpiformat._proc_init({}, False, False, {"timings": timings})
+
+    # Files without history are estimated from the time per byte of files with
+    # history
+    costs = wpiformat._get_costs(filenames, "pipeline")
+    assert costs[filenames[1]] == 3.0
+    assert costs[filenames[2]] == 0.5
+    assert costs[filenames[0]] == pytest.approx(100 * 3.5 / 60)
+
+    batches = wpiformat._partition_by_cost(filenames, 3, costs)
+    assert [[f.name for f in batch] for batch in batches] == [["a"], ["b"], ["c"]]
+
+
+class UppercaseTask(PipelineTask):
+    @staticmethod
+    def should_process_file(config_file, filename):
+        return True
+
+    def run_pipeline(self, config_file, filename, lines):
+        return lines.upper(), True
+
+
+def test_proc_pipeline_write_back_is_atomic(monkeypatch, tmp_path):
+    filename = tmp_path / "a.cpp"
+    filename.write_text("int x;\n")
+    filename.chmod(0o755)
+
+    task_pipelines = {wpiformat.PipelineTask: [UppercaseTask()]}
+    wpiformat._proc_init(task_pipelines, False, False)
+
+    # A chunk interrupted during the write-back leaves the original file intact
+    def interrupt(src, dst):
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as m:
+        m.setattr(wpiformat.os, "replace", interrupt)
+        with pytest.raises(KeyboardInterrupt):
+            wpiformat._proc_pipeline([filename])
+    assert filename.read_text() == "int x;\n"
+    assert list(tmp_path.iterdir()) == [filename]
+
+    wpiformat._proc_pipeline([filename])
+    assert filename.read_text() == "INT X;\n"
+    assert filename.stat().st_mode & 0o777 == 0o755
+    assert list(tmp_path.iterdir()) == [filename]
+
+
+class TokenizingTask(PipelineTask):
+    @staticmethod
+    def should_process_file(config_file, filename):
+        return True
+
+    def run_pipeline(self, config_file, filename, lines):
+        Tokenizer.get(lines)
+        return lines, True
+
+
+def test_proc_pipeline_tokenizes_each_file_once(monkeypatch, tmp_path):
+    filenames = [tmp_path / f"{name}.cpp" for name in ["a", "b", "c"]]
+    for filename in filenames:
+        filename.write_text(f"// {filename.name}\n")
+
+    tokenizations = []
+    init = Tokenizer.__init__
+
+    def counting_init(self, lines):
+        tokenizations.append(lines)
+        init(self, lines)
+
+    monkeypatch.setattr(Tokenizer, "__init__", counting_init)
+
+    # Each file is run through both tasks before the next file starts, so the
+    # second task reuses the first task's Tokenizer
+    task_pipelines = {wpiformat.PipelineTask: [TokenizingTask(), TokenizingTask()]}
+    wpiformat._proc_init(task_pipelines, False, False)
+    wpiformat._proc_pipeline(filenames)
+
+    assert len(tokenizations) == len(filenames)
+
+
+class DiagnosticTask(StandaloneTask):
+    def __init__(self):
+        super().__init__()
+        self.diagnostics = []
+        self.runs = 0
+
+    @staticmethod
+    def should_process_file(config_file, filename):
+        return True
+
+    def get_cache_key(self, config_file, filename, include_graph):
+        return filename.read_text()
+
+    def run_standalone(self, config_file, filename):
+        self.runs += 1
+
+        # Each file includes the same header
+        self.diagnostics += [
+            (str(filename), 1, "check", "message", f"{filename.name}:1: message"),
+            ("header.h", 2, "check", "message", "header.h:2: message"),
+        ]
+        return False
+
+    def pop_diagnostics(self):
+        diagnostics = self.diagnostics
+        self.diagnostics = []
+        return diagnostics
+
+
+def test_run_standalone_deduplicates_diagnostics(tmp_path, capsys):
+    filenames = [tmp_path / "a.cpp", tmp_path / "b.cpp"]
+    for filename in filenames:
+        filename.write_text("")
+
+    task_pipelines = {wpiformat.StandaloneTask: [DiagnosticTask()]}
+    with SynchronousPool(
+        2, wpiformat._proc_init, (task_pipelines, False, False)
+    ) as pool:
+        assert not wpiformat._run_standalone(pool, 2, filenames)
+
+    output = capsys.readouterr().out
+    assert output.count("header.h:2: message") == 1
+    assert "a.cpp:1: message" in output
+    assert "b.cpp:1: message" in output
+
+
+def test_run_standalone_replays_cached_diagnostics(tmp_path, capsys):
+    filenames = [tmp_path / "a.cpp", tmp_path / "b.cpp"]
+    for filename in filenames:
+        filename.write_text("")
+
+    task = DiagnosticTask()
+    task_pipelines = {wpiformat.StandaloneTask: [task]}
+    cache = Cache(tmp_path / "tidy.json", "")
+    include_graph = IncludeGraph(filenames)
+    with SynchronousPool(
+        2, wpiformat._proc_init, (task_pipelines, False, False)
+    ) as pool:
+        assert not wpiformat._run_standalone(pool, 2, filenames, cache, include_graph)
+        output = capsys.readouterr().out
+        assert task.runs == 2
+
+        # Unmodified files are replayed from the cache. Diagnostics are
+        # printed as they arrive, so only the order of the output changes.
+        cache = Cache(tmp_path / "tidy.json", "")
+        assert not wpiformat._run_standalone(pool, 2, filenames, cache, include_graph)
+        assert sorted(capsys.readouterr().out.splitlines()) == sorted(
+            output.splitlines()
+        )
+        assert task.runs == 2
+
+        # Modified files are checked again
+        filenames[0].write_text("int x;")
+        assert not wpiformat._run_standalone(pool, 2, filenames, cache, include_graph)
+        assert sorted(capsys.readouterr().out.splitlines()) == sorted(
+            output.splitlines()
+        )
+        assert task.runs == 3
+
+
+def test_run_standalone_fail_fast(tmp_path, capsys):
+    filenames = [tmp_path / "a.cpp", tmp_path / "b.cpp"]
+    for filename in filenames:
+        filename.write_text("")
+
+    task = DiagnosticTask()
+    task_pipelines = {wpiformat.StandaloneTask: [task]}
+    SynchronousPool.callbacks = []
+    with SynchronousPool(
+        2, wpiformat._proc_init, (task_pipelines, False, False)
+    ) as pool:
+        assert not wpiformat._run_standalone(pool, 2, filenames, fail_fast=True)
+
+    # The pool is canceled after the first batch fails
+    assert task.runs == 1
+    assert SynchronousPool.callbacks == ["_proc_standalone", "terminate"]
+
+
+class FailingTask(StandaloneTask):
+    @staticmethod
+    def should_process_file(config_file, filename):
+        return True
+
+    def run_standalone(self, config_file, filename):
+        return filename.name != "fail.cpp"
+
+
+def test_run_standalone_fail_fast_terminates_pool(tmp_path):
+    filenames = [tmp_path / f"{name}.cpp" for name in ["fail", "a", "b", "c"]]
+    for filename in filenames:
+        filename.write_text("")
+
+    # Most workers are idle waiting for work when the pool is canceled
+    task_pipelines = {wpiformat.StandaloneTask: [FailingTask()]}
+    wpiformat._proc_init(task_pipelines, False, False)
+    results = []
+
+    def run():
+        with mp.Pool(
+            8, wpiformat._proc_worker_init, (True, task_pipelines, False, False)
+        ) as pool:
+            results.append(
+                wpiformat._run_standalone(pool, 8, filenames, fail_fast=True)
+            )
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(60)
+    assert not thread.is_alive()
+    assert results == [False]
+
+
+def test_run_standalone_records_timings(tmp_path):
+    filenames = [tmp_path / f"{name}.cpp" for name in ["a", "b", "c"]]
+    for filename in filenames:
+        filename.write_text("")
+
+    # Timings recorded by workers are sent back to this process
+    task_pipelines = {wpiformat.StandaloneTask: [FailingTask()]}
+    timings = Cache(None, "")
+    init_args = (task_pipelines, False, False, {"timings": timings})
+    wpiformat._proc_init(*init_args)
+    with mp.Pool(2, wpiformat._proc_init, init_args) as pool:
+        assert wpiformat._run_standalone(pool, 2, filenames)
+
+    for filename in filenames:
+        assert "FailingTask" in timings.get(f"standalone:{filename.as_posix()}")
@@ -0,0 +1,27 @@
+from pathlib import Path
+
+from wpiformat.task import PipelineEditTask, Task
+
+
+def test_apply_edits():
+    lines = "int main() {}\n"
+
+    # Contents aren't copied if there are no edits
+    assert PipelineEditTask.apply_edits(lines, []) is lines
+
+    assert (
+        PipelineEditTask.apply_edits(lines, [(0, 3, "void"), (8, 10, "(void)")])
+        == "void main(void) {}\n"
+    )
+    assert PipelineEditTask.apply_edits(lines, [(13, 14, "")]) == "int main() {}"
+
+
+def test_chunk_args():
+    filenames = [Path("aaaa"), Path("bb"), Path("cc"), Path("dddd")]
+
+    # Each name is followed by a space
+    assert list(Task.chunk_args(filenames, 8)) == [
+        [Path("aaaa"), Path("bb")],
+        [Path("cc"), Path("dddd")],
+    ]
+    assert list(Task.chunk_args(filenames, 100)) == [filenames]
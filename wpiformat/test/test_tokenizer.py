@@ -0,0 +1,33 @@
+from wpiformat.tokenizer import RegionType, Tokenizer
+
+
+def test_tokenizer():
+    lines = """int x = 1'000; // comment "
+char c = '"'; /* multiline
+comment */ auto s = "// \\" '";
+"""
+    tokenizer = Tokenizer(lines)
+
+    def region(text: str, type: RegionType) -> tuple[int, int, RegionType]:
+        start = lines.index(text)
+        return start, start + len(text), type
+
+    assert tokenizer.regions == [
+        region('// comment "', RegionType.COMMENT),
+        region("'\"'", RegionType.CHAR),
+        region("/* multiline\ncomment */", RegionType.COMMENT),
+        region('"// \\" \'"', RegionType.STRING),
+    ]
+
+    assert tokenizer.in_code(lines.index("int"))
+    assert tokenizer.in_code(lines.index("000"))
+    assert not tokenizer.in_code(lines.index("comment"))
+    assert tokenizer.in_code(lines.index("auto"))
+    assert not tokenizer.in_code(lines.index("multiline"))
+
+    # Unterminated regions extend to the end of the file
+    assert Tokenizer("x /* y").regions == [(2, 6, RegionType.COMMENT)]
+
+    # Tokenizer is reused for unmodified contents
+    assert Tokenizer.get(lines) is Tokenizer.get(lines[:])
+    assert Tokenizer.get(lines) is not Tokenizer.get(lines + "\n")
@@ -1,18 +1,31 @@
 import argparse
+import functools
+import heapq
+import io
+import itertools
 import math
 import multiprocessing as mp
+import os
+import signal
 import subprocess
 import sys
+import tempfile
+import time
 from collections.abc import Generator
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import date
 from pathlib import Path
+from typing import Any
 
 from wpiformat.bracecomment import BraceComment
+from wpiformat.cache import Cache, get_cache_dir, get_environment, hash_contents
 from wpiformat.cidentlist import CIdentList
 from wpiformat.clangformat import ClangFormat
 from wpiformat.clangtidy import ClangTidy
 from wpiformat.cmakeformat import CMakeFormat
 from wpiformat.config import Config
 from wpiformat.eofnewline import EofNewline
+from wpiformat.includegraph import IncludeGraph
 from wpiformat.includeguard import IncludeGuard
 from wpiformat.javaclass import JavaClass
 from wpiformat.jni import Jni
@@ -25,6 +38,56 @@ from wpiformat.usingnamespacestd import UsingNamespaceStd
 from wpiformat.whitespace import Whitespace
 
 
+def _list_unignored_files(directory: Path) -> Generator[Path, None, None]:
+    """Yields files within directory that aren't in .gitignore.
+
+    Tracked and untracked files are listed by one "git ls-files" call, so
+    ignored directories are never traversed. Its output is parsed as it's
+    streamed. Initialized submodules are listed recursively.
+
+    Tracked files which match .gitignore (e.g., force-added generated files)
+    are skipped too, like "git check-ignore --no-index" does.
+
+    Keyword arguments:
+    directory -- directory to list
+    """
+    # -z prints names verbatim instead of quoting them and separates them with
+    # NUL characters
+    ignored_names = set(
+        subprocess.run(
+            ["git", "ls-files", "-z", "--cached", "--ignored", "--exclude-standard"],
+            cwd=directory,
+            stdout=subprocess.PIPE,
+            check=True,
+        ).stdout.split(b"\0")
+    )
+
+    with subprocess.Popen(
+        ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+        cwd=directory,
+        stdout=subprocess.PIPE,
+    ) as proc:
+        remainder = b""
+        while chunk := proc.stdout.read(64 * 1024):
+            *names, remainder = (remainder + chunk).split(b"\0")
+            for name in names:
+                if name in ignored_names:
+                    continue
+                filename = directory / os.fsdecode(name)
+
+                # Skip tracked files deleted from the working tree and
+                # directories. Submodules are listed as directories.
+                if not filename.is_file():
+                    if (filename / ".git").exists():
+                        yield from _list_unignored_files(filename)
+                    continue
+
+                yield filename
+
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, proc.args)
+
+
 def _filter_for_unignored_files(filenames: list[Path]) -> list[Path]:
     """Returns list of files not in .gitignore.
 
@@ -63,242 +126,1015 @@ def _filter_for_unignored_files(filenames: list[Path]) -> list[Path]:
     ]
 
 
-def _proc_init(task_pipeline_copy, verbose1_copy, verbose2_copy):
+def _proc_init(task_pipelines_copy, verbose1_copy, verbose2_copy, caches_copy=None):
     """Common initialization for process pool worker.
 
     Keyword arguments:
-    task_pipeline_copy -- task pipeline
+    task_pipelines_copy -- dictionary from task base class (PipelineTask,
+                           BatchTask, or StandaloneTask) to the task pipeline
+                           run in that phase
     verbose1_copy -- verbose1 flag
     verbose2_copy -- verbose2 flag
+    caches_copy -- dictionary from name to cache which workers update (e.g.,
+                   "pipeline" for the pipeline cache). It's empty if caching
+                   is disabled.
     """
-    global task_pipeline
+    global task_pipelines
     global verbose1
     global verbose2
     global print_lock
+    global caches
+    global pipeline_cache
 
-    task_pipeline = task_pipeline_copy
+    task_pipelines = task_pipelines_copy
     verbose1 = verbose1_copy
     verbose2 = verbose2_copy
     print_lock = mp.Lock()
+    caches = caches_copy or {}
+    pipeline_cache = caches.get("pipeline")
+
+
+def _proc_worker_init(new_process_group: bool, *init_args):
+    """Initialization for process pool worker processes.
+
+    Keyword arguments:
+    new_process_group -- whether to move the worker into its own process group
+                         so it and the subprocesses it starts can be killed
+                         together (POSIX only)
+    *init_args -- arguments for _proc_init()
+    """
+    if new_process_group and sys.platform != "win32":
+        os.setpgrp()
+    _proc_init(*init_args)
+
+
+def _cancel_pool(pool):
+    """Stops process pool workers without waiting for their work to finish.
+
+    On POSIX, workers started with a new process group are killed along with
+    any subprocesses they started (e.g., clang-format or clang-tidy). On
+    Windows, only the workers are terminated.
+
+    Keyword arguments:
+    pool -- process pool
+    """
+    pids = [child.pid for child in mp.active_children()]
+
+    # The pool is terminated before the process groups are killed. Killing an
+    # idle worker while it holds the pool's task queue lock would deadlock
+    # pool.terminate().
+    pool.terminate()
+
+    if sys.platform != "win32":
+        for pid in pids:
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except OSError:
+                # The process group is already gone or the worker wasn't a
+                # process group leader
+                pass
+
+
+def _pop_cache_updates() -> dict[str, dict[str, Any]]:
+    """Returns entries set in each cache by this worker and clears them.
+
+    Returns dictionary from cache name to new entries.
+    """
+    return {name: cache.pop_updates() for name, cache in caches.items()}
+
+
+def _save_cache_updates(updates: list[dict[str, dict[str, Any]]]):
+    """Merges cache entries returned by workers and saves the caches.
+
+    Keyword arguments:
+    updates -- list of return values of _pop_cache_updates()
+    """
+    for worker_updates in updates:
+        for name, cache_updates in worker_updates.items():
+            caches[name].merge(cache_updates)
+    for cache in caches.values():
+        cache.save()
 
 
-def _proc_pipeline(filename: Path) -> bool:
+def _get_pipeline_cache_key(config_file: Config, filename: Path, lines: str) -> str:
+    """Returns the pipeline cache key for a file.
+
+    The key covers the file contents and the contents of every config file that
+    affects the task pipeline's output for it.
+
+    Keyword arguments:
+    config_file -- Config object
+    filename -- filename
+    lines -- file contents
+    """
+    config_contents = [str(config_file.filename)]
+
+    # TODO: Remove handling for deprecated .styleguide-license file
+    for config_name in [".wpiformat-license", ".styleguide-license"]:
+        try:
+            config_filename, contents = Config.read_file(
+                filename.parent, Path(config_name)
+            )
+            config_contents += [str(config_filename), *contents]
+            break
+        except OSError:
+            pass
+    else:
+        config_contents.append("<none found>")
+
+    # A style file with "BasedOnStyle: InheritParentConfig" depends on the ones
+    # in parent directories, and cpplint applies every CPPLINT.cfg in them
+    for config_name in [".clang-format", "_clang-format", "CPPLINT.cfg"]:
+        config_contents += Config.read_file_chain(filename.parent, config_name)
+
+    if config_file.filename != "<none found>":
+        _, contents = Config.read_file(
+            config_file.filename.parent, Path(config_file.filename.name)
+        )
+        config_contents += contents
+
+    return hash_contents(lines, *config_contents)
+
+
+class _PipelineFile:
+    def __init__(self, filename: Path, config_file: Config, lines: str):
+        """State of a file while it's run through the task pipeline.
+
+        Keyword arguments:
+        filename -- filename
+        config_file -- Config object
+        lines -- original file contents
+        """
+        self.filename = filename
+        self.config_file = config_file
+        self.lines = lines
+        self.output = lines
+        self.success = True
+
+        # Task output is captured so it can be replayed on cache hits
+        self.stdout = io.StringIO()
+
+        # Dictionary from task name to seconds spent on the file
+        self.timings: dict[str, float] = {}
+
+
+def _capture_output(func):
+    """Decorates a process pool worker function so the output it prints is
+    returned to the main process instead.
+
+    The main process prints it after erasing the progress line, so the two
+    aren't interleaved. A tuple of the printed stdout and stderr contents is
+    appended to the function's return value.
+
+    Keyword arguments:
+    func -- worker function returning a tuple
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        with (
+            redirect_stdout(io.StringIO()) as stdout,
+            redirect_stderr(io.StringIO()) as stderr,
+        ):
+            result = func(*args)
+        return (*result, (stdout.getvalue(), stderr.getvalue()))
+
+    return wrapper
+
+
+def _print_worker_output(output: tuple[str, str]):
+    """Prints output captured from a worker function by _capture_output().
+
+    Keyword arguments:
+    output -- tuple of stdout and stderr contents
+    """
+    stdout, stderr = output
+    print(stdout, end="", flush=True)
+    print(stderr, end="", file=sys.stderr, flush=True)
+
+
+def _write_file_atomic(filename: Path, contents: bytes):
+    """Replaces a file's contents atomically.
+
+    The contents are written to a temporary file in the same directory, which
+    is then renamed over the original. A worker terminated partway through
+    leaves the original file intact instead of truncated.
+
+    Keyword arguments:
+    filename -- filename
+    contents -- new file contents
+    """
+    mode = filename.stat().st_mode
+    with tempfile.NamedTemporaryFile(
+        dir=filename.parent, prefix=f".{filename.name}.", delete=False
+    ) as temp_file:
+        temp_filename = Path(temp_file.name)
+        try:
+            temp_file.write(contents)
+        except BaseException:
+            temp_file.close()
+            temp_filename.unlink()
+            raise
+
+    try:
+        os.chmod(temp_filename, mode)
+        os.replace(temp_filename, filename)
+    except BaseException:
+        temp_filename.unlink(missing_ok=True)
+        raise
+
+
+def _run_pipeline_batch(subtask: PipelineTask, work: list[_PipelineFile]):
+    """Runs a task which supports batching on every file in a chunk at once.
+
+    Keyword arguments:
+    subtask -- task with batch_pipeline set
+    work -- files in the chunk
+    """
+    subwork = [
+        file
+        for file in work
+        if subtask.should_process_file(file.config_file, file.filename)
+    ]
+    if not subwork:
+        return
+
+    start = time.perf_counter()
+    results = subtask.run_pipeline_batch(
+        [(file.config_file, file.filename, file.output) for file in subwork]
+    )
+    for file, seconds in _split_elapsed(
+        time.perf_counter() - start,
+        {file: len(file.output) for file in subwork},
+    ).items():
+        file.timings[type(subtask).__name__] = seconds
+
+    for file, (output, success) in zip(subwork, results):
+        file.output = output
+        file.success &= success
+
+
+@_capture_output
+def _proc_pipeline(
+    filenames: list[Path],
+) -> tuple[list[Path], bool, dict[str, dict[str, Any]]]:
     """Runs the contents of each file through the task pipeline.
 
     If the contents were modified at any point, the result is written back out
     to the file.
 
+    Tasks are run on one file at a time, except for tasks that support
+    batching (e.g., ClangFormat). Those process the whole chunk in one
+    subprocess once every file has reached them.
+
+    Files which the cache records as already clean are skipped, and the output
+    the task pipeline printed for them is replayed instead.
+
+    The time each task spent on each file is recorded in the timing history.
+
     Keyword arguments:
-    filename -- filename
+    filenames -- chunk of filenames
+
+    Returns tuple containing the chunk, whether all tasks succeeded, and new
+    cache entries.
     """
-    # TODO: Remove handling for deprecated .styleguide file
-    config_file = Config(filename.parent, Path(".wpiformat"))
-    if config_file.filename == "<none found>":
-        config_file = Config(filename.parent, Path(".styleguide"))
+    task_pipeline = task_pipelines[PipelineTask]
+
+    # The success flag is aggregated across multiple file processing results
+    all_success = True
+
+    work: list[_PipelineFile] = []
+    cache_keys: dict[Path, str] = {}
+    for filename in filenames:
+        config_file = Config.get(filename.parent)
+
+        if verbose1 or verbose2:
+            with print_lock:
+                print("Processing", filename)
+                if verbose2:
+                    print(f"  with config {config_file.filename}")
+                    for subtask in task_pipeline:
+                        if subtask.should_process_file(config_file, filename):
+                            print("  with " + type(subtask).__name__)
+
+        try:
+            lines = filename.read_text(encoding="utf-8")
+        except UnicodeDecodeError:
+            print(
+                f"error: {filename} contains characters not in UTF-8. Should this be considered a generated file?"
+            )
+            all_success = False
+            continue
+
+        if pipeline_cache:
+            cache_key = _get_pipeline_cache_key(config_file, filename, lines)
+            entry = pipeline_cache.get(filename.as_posix())
+            if entry and entry[0] == cache_key:
+                print(entry[1], end="")
+                continue
+            cache_keys[filename] = cache_key
+
+        work.append(_PipelineFile(filename, config_file, lines))
+
+    # Consecutive tasks which don't support batching are run on one file at a
+    # time, so the Tokenizer and LineIndex memoized for a file's contents are
+    # reused between them
+    for batch_pipeline, subtasks in itertools.groupby(
+        task_pipeline, key=lambda subtask: subtask.batch_pipeline
+    ):
+        if batch_pipeline:
+            for subtask in subtasks:
+                _run_pipeline_batch(subtask, work)
+            continue
+
+        subtasks = list(subtasks)
+        for file in work:
+            for subtask in subtasks:
+                if not subtask.should_process_file(file.config_file, file.filename):
+                    continue
+
+                start = time.perf_counter()
+                with redirect_stdout(file.stdout):
+                    output, success = subtask.run_pipeline(
+                        file.config_file, file.filename, file.output
+                    )
+                file.timings[type(subtask).__name__] = time.perf_counter() - start
+
+                file.output = output
+                file.success &= success
+
+    _record_timings("pipeline", {file.filename: file.timings for file in work})
+
+    for file in work:
+        print(file.stdout.getvalue(), end="")
+        all_success &= file.success
+
+        if file.lines != file.output:
+            _write_file_atomic(file.filename, file.output.encode())
+        elif pipeline_cache and file.success:
+            # Only files the task pipeline left unmodified are recorded as clean
+            pipeline_cache.set(
+                file.filename.as_posix(),
+                [cache_keys[file.filename], file.stdout.getvalue()],
+            )
+
+    return filenames, all_success, _pop_cache_updates()
+
+
+@_capture_output
+def _proc_standalone(
+    filenames: list[Path],
+) -> tuple[
+    list[Path], bool, list[tuple[str, int, str, str, str]], dict[str, dict[str, Any]]
+]:
+    """Runs each task on a batch of files.
 
-    if verbose1 or verbose2:
+    The time each task spent on the batch is split between its files in
+    proportion to their estimated costs and recorded in the timing history.
+
+    Keyword arguments:
+    filenames -- batch of filenames
+
+    Returns tuple containing the batch, whether all tasks succeeded, the
+    diagnostics they reported, and new cache entries.
+    """
+    task_pipeline = task_pipelines[StandaloneTask]
+    costs = _get_costs(filenames, "standalone")
+    timings: dict[Path, dict[str, float]] = {filename: {} for filename in filenames}
+
+    config_files = [Config.get(filename.parent) for filename in filenames]
+
+    if verbose2:
         with print_lock:
-            print("Processing", filename)
-            if verbose2:
-                print(f"  with config {config_file.filename}")
+            for config_file, filename in zip(config_files, filenames):
+                print("Processing", filename)
                 for subtask in task_pipeline:
                     if subtask.should_process_file(config_file, filename):
                         print("  with " + type(subtask).__name__)
 
-    try:
-        lines = filename.read_text(encoding="utf-8")
-    except UnicodeDecodeError:
-        print(
-            f"error: {filename} contains characters not in UTF-8. Should this be considered a generated file?"
-        )
-        return False
-
     # The success flag is aggregated across multiple file processing results
     all_success = True
 
-    output = lines
     for subtask in task_pipeline:
-        if subtask.should_process_file(config_file, filename):
-            output, success = subtask.run_pipeline(config_file, filename, output)
-            all_success &= success
+        work = [
+            (config_file, filename)
+            for config_file, filename in zip(config_files, filenames)
+            if subtask.should_process_file(config_file, filename)
+        ]
+        if work:
+            start = time.perf_counter()
+            all_success &= subtask.run_standalone_batch(work)
+            for filename, seconds in _split_elapsed(
+                time.perf_counter() - start,
+                {filename: costs[filename] for _, filename in work},
+            ).items():
+                timings[filename][type(subtask).__name__] = seconds
 
-    if lines != output:
-        filename.write_bytes(output.encode())
+    _record_timings("standalone", timings)
 
-    return all_success
+    diagnostics = []
+    for subtask in task_pipeline:
+        diagnostics += subtask.pop_diagnostics()
+
+    return filenames, all_success, diagnostics, _pop_cache_updates()
 
 
-def _proc_standalone(filename: Path) -> bool:
-    """Runs each task on each file.
+def _get_file_size(filename: Path) -> int:
+    """Returns size of file in bytes or 0 if it couldn't be read.
 
     Keyword arguments:
     filename -- filename
     """
-    # TODO: Remove handling for deprecated .styleguide file
-    config_file = Config(filename.parent, Path(".wpiformat"))
-    if config_file.filename == "<none found>":
-        config_file = Config(filename.parent, Path(".styleguide"))
+    try:
+        return filename.stat().st_size
+    except OSError:
+        return 0
 
-    if verbose2:
-        with print_lock:
-            print("Processing", filename)
-            for subtask in task_pipeline:
-                if subtask.should_process_file(config_file, filename):
-                    print("  with " + type(subtask).__name__)
 
-    # The success flag is aggregated across multiple file processing results
+def _get_costs(filenames: list[Path], phase: str) -> dict[Path, float]:
+    """Returns estimated cost of processing each file in a phase.
+
+    A file's cost is the total time tasks spent on it the last time the phase
+    processed it. Files without a recorded time are estimated from their size,
+    scaled by the time per byte of the files with one.
+
+    Keyword arguments:
+    filenames -- list of filenames
+    phase -- phase name used in the timing history (e.g., "pipeline")
+    """
+    timings = caches.get("timings")
+
+    sizes = {filename: _get_file_size(filename) for filename in filenames}
+    costs: dict[Path, float] = {}
+    if timings:
+        for filename in filenames:
+            entry = timings.get(f"{phase}:{filename.as_posix()}")
+            if entry:
+                costs[filename] = sum(entry.values())
+
+    known_size = sum(sizes[filename] for filename in costs)
+    known_time = sum(costs.values())
+    seconds_per_byte = known_time / known_size if known_size and known_time else 1.0
+
+    for filename in filenames:
+        if filename not in costs:
+            costs[filename] = sizes[filename] * seconds_per_byte
+    return costs
+
+
+def _split_elapsed(elapsed: float, costs: dict[Any, float]) -> dict[Any, float]:
+    """Splits time spent on a batch between its items.
+
+    Keyword arguments:
+    elapsed -- seconds spent on the batch
+    costs -- dictionary from item to its estimated cost. Time is split in
+             proportion to these, or evenly if they're all zero.
+    """
+    total = sum(costs.values())
+    if not total:
+        return {item: elapsed / len(costs) for item in costs}
+    return {item: elapsed * cost / total for item, cost in costs.items()}
+
+
+def _record_timings(phase: str, timings: dict[Path, dict[str, float]]):
+    """Records time tasks spent on files in the timing history.
+
+    Keyword arguments:
+    phase -- phase name used in the timing history (e.g., "pipeline")
+    timings -- dictionary from filename to dictionary from task name to
+               seconds spent on the file
+    """
+    if cache := caches.get("timings"):
+        for filename, task_timings in timings.items():
+            if task_timings:
+                cache.set(
+                    f"{phase}:{filename.as_posix()}",
+                    {name: round(seconds, 6) for name, seconds in task_timings.items()},
+                )
+
+
+def _partition_by_cost(
+    filenames: list[Path],
+    count: int,
+    costs: dict[Path, float] | None = None,
+    spread_suffixes: bool = False,
+) -> list[list[Path]]:
+    """Partitions files into batches with roughly equal total cost.
+
+    Files are assigned from most to least costly to the batch with the lowest
+    total so far (longest processing time first scheduling).
+
+    Keyword arguments:
+    filenames -- list of filenames
+    count -- maximum number of batches
+    costs -- dictionary from filename to estimated cost (e.g., from
+             _get_costs()). If None, a file's cost is its size.
+    spread_suffixes -- if true, files with each suffix are assigned together,
+                       starting with the most costly suffix, so each batch gets
+                       a similar mix of file types
+
+    Returns list of nonempty batches sorted from most to least costly.
+    """
+    if costs is None:
+        costs = {filename: _get_file_size(filename) for filename in filenames}
+
+    order = sorted(filenames, key=lambda f: costs[f], reverse=True)
+    if spread_suffixes:
+        groups: dict[str, list[Path]] = {}
+        for filename in order:
+            groups.setdefault(filename.suffix, []).append(filename)
+        order = [
+            filename
+            for group in sorted(
+                groups.values(),
+                key=lambda group: sum(costs[f] for f in group),
+                reverse=True,
+            )
+            for filename in group
+        ]
+
+    # Heap of (total cost, file count, index, batch). Ties are broken by file
+    # count so files with no cost are spread out, then by index so batches are
+    # never compared.
+    batches: list[tuple[float, int, int, list[Path]]] = [
+        (0, 0, i, []) for i in range(min(count, len(filenames)))
+    ]
+    for filename in order:
+        cost, length, i, batch = batches[0]
+        batch.append(filename)
+        heapq.heapreplace(batches, (cost + costs[filename], length + 1, i, batch))
+
+    batches.sort(key=lambda batch: (-batch[0], batch[2]))
+    return [batch for _, _, _, batch in batches]
+
+
+def _run_batch_task(subtask: BatchTask, filenames: list[Path]) -> bool:
+    """Runs a batch task on the files it processes.
+
+    Keyword arguments:
+    subtask -- batch task
+    filenames -- list of filenames
+
+    Returns true if the task succeeded.
+    """
     all_success = True
 
-    for subtask in task_pipeline:
+    work: list[Path] = []
+    for filename in filenames:
+        config_file = Config.get(filename.parent)
+
         if subtask.should_process_file(config_file, filename):
-            success = subtask.run_standalone(config_file, filename)
-            all_success &= success
+            work.append(filename)
+
+    if work:
+        # Tasks which don't start a subprocess aren't limited by command line
+        # length
+        if subtask.in_process:
+            chunks = [work]
+        else:
+            chunks = list(Task.chunk_args(work, Task.get_max_args_len()))
+
+        for subwork in chunks:
+            if verbose1 or verbose2:
+                print("Running", type(subtask).__name__)
+                if verbose2:
+                    for name in subwork:
+                        print("  on", name)
+            all_success &= subtask.run_batch(config_file, subwork)
 
     return all_success
 
 
-def _chunks(iterable: list[Path], max_len: int) -> Generator[list[Path], None, None]:
-    """
-    Yield successive chunks from iterable whose content lengths sum to less than
-    max_len.
-    """
-    out = []
-    size = 0
-    for i, arg in enumerate(iterable):
-        out.append(arg)
-        size += len(arg.as_posix()) + len(" ")
-        if i == len(iterable) - 1 or size + len(iterable[i + 1].as_posix()) > max_len:
-            yield out
-            out = []
-            size = 0
-
-
-def _proc_batch(filenames: list[Path]) -> bool:
+@_capture_output
+def _proc_batch(
+    filenames: list[Path],
+) -> tuple[list[Path], bool, dict[str, dict[str, Any]]]:
     """Runs each task in the pipeline on batches of files.
 
     These tasks read and write to the files directly. They are given a list of
-    all files at once to avoid spawning too many subprocesses.
+    all files at once to avoid spawning too many subprocesses. Globally batched
+    tasks are skipped because the main process runs them on all files.
 
     Keyword arguments:
     filenames -- list of filenames
 
-    Returns true if all tasks succeeded.
+    Returns tuple containing the list of filenames, whether all tasks
+    succeeded, and new cache entries.
     """
     all_success = True
 
-    for subtask in task_pipeline:
-        work: list[Path] = []
-        for filename in filenames:
-            # TODO: Remove handling for deprecated .styleguide file
-            config_file = Config(filename.parent, Path(".wpiformat"))
-            if config_file.filename == "<none found>":
-                config_file = Config(filename.parent, Path(".styleguide"))
+    for subtask in task_pipelines[BatchTask]:
+        if not subtask.global_batch:
+            all_success &= _run_batch_task(subtask, filenames)
+
+    return filenames, all_success, _pop_cache_updates()
+
+
+class _Progress:
+    """Prints a progress line to stderr as files are processed."""
+
+    def __init__(self, phase: str, total: int, enabled: bool):
+        """Constructor for _Progress.
+
+        Keyword arguments:
+        phase -- name of phase printed at start of line
+        total -- number of files the phase processes
+        enabled -- whether to print anything
+        """
+        self.phase = phase
+        self.total = total
+        self.enabled = enabled
+        self.done = 0
+        self.start = time.monotonic()
+        self.line_len = 0
+
+    def update(self, count: int):
+        """Records that more files were processed and reprints the line.
+
+        Keyword arguments:
+        count -- number of files processed since the last update
+        """
+        self.done += count
+        if not self.enabled or not self.total:
+            return
+
+        elapsed = time.monotonic() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 else 0.0
+
+        # The line is overwritten in place until the phase finishes
+        line = (
+            f"{self.phase}: {self.done}/{self.total} files, "
+            + f"{rate:.1f} files/s, ETA {eta:.0f}s"
+        )
+        self.clear()
+        if self.done >= self.total:
+            print(line, file=sys.stderr, flush=True)
+        else:
+            print(line, end="", file=sys.stderr, flush=True)
+            self.line_len = len(line)
+
+    def clear(self):
+        """Erases the progress line so other output can be printed."""
+        if self.line_len:
+            print("\r" + " " * self.line_len + "\r", end="", file=sys.stderr)
+            self.line_len = 0
+
+
+def _run_pipeline(
+    pool,
+    jobs: int,
+    filenames: list[Path],
+    progress: bool = False,
+    fail_fast: bool = False,
+) -> bool:
+    """Runs _proc_pipeline() on process pool.
 
-            if subtask.should_process_file(config_file, filename):
-                work.append(filename)
+    Keyword arguments:
+    pool -- process pool
+    jobs -- number of worker processes
+    filenames -- list of filenames to process
+    progress -- whether to print a progress line
+    fail_fast -- whether to cancel the pool when a task fails
 
-        if work:
-            # Conservative estimate for max argument length. 32767 is from the
-            # Win32 docs for CreateProcessA(), but the limit appears to be lower
-            # than that in practice.
-            MAX_WIN32_ARGS_LEN = int(32767 * 7 / 8)
-
-            for subwork in _chunks(work, MAX_WIN32_ARGS_LEN):
-                if verbose1 or verbose2:
-                    print("Running", type(subtask).__name__)
-                    if verbose2:
-                        for name in subwork:
-                            print("  on", name)
-                all_success &= subtask.run_batch(config_file, subwork)
+    Returns true if all tasks succeeded.
+    """
+    # Files are sent to workers in small chunks. Batched tasks amortize their
+    # subprocess startup over each chunk, and having several chunks per worker
+    # keeps the load balanced. Chunks are balanced by the files' recorded times
+    # and dispatched longest first so no large file is left for the end.
+    chunksize = max(min(math.ceil(len(filenames) / (jobs * 4)), 32), 1)
+    filename_chunks = _partition_by_cost(
+        filenames,
+        math.ceil(len(filenames) / chunksize),
+        _get_costs(filenames, "pipeline"),
+    )
+
+    # Start worker processes for task pipeline. Results are collected in
+    # completion order so a slow chunk doesn't hold up the rest.
+    all_success = True
+    cache_updates = []
+    status = _Progress("format", len(filenames), progress)
+    for chunk, success, updates, output in pool.imap_unordered(
+        _proc_pipeline, filename_chunks
+    ):
+        all_success &= success
+        cache_updates.append(updates)
+        status.clear()
+        _print_worker_output(output)
+        status.update(len(chunk))
+
+        if fail_fast and not success:
+            status.clear()
+            _cancel_pool(pool)
+            break
+
+    _save_cache_updates(cache_updates)
 
     return all_success
 
 
-def _run_pipeline(task_pipeline, args, filenames: list[Path]) -> bool:
-    """Spawns process pool for _proc_pipeline().
+def _run_batch(
+    pool,
+    jobs: int,
+    subtasks: list[BatchTask],
+    filenames: list[Path],
+    progress: bool = False,
+    fail_fast: bool = False,
+) -> bool:
+    """Runs batch tasks.
+
+    Globally batched tasks are run once in this process on all files. The rest
+    are run by _proc_batch() on the process pool.
 
     Keyword arguments:
-    task_pipeline -- task pipeline
-    args -- command line arguments from argparse
+    pool -- process pool
+    jobs -- number of worker processes
+    subtasks -- list of batch tasks
     filenames -- list of filenames to process
+    progress -- whether to print a progress line
+    fail_fast -- whether to stop at the first failed task
 
     Returns true if all tasks succeeded.
     """
-    init_args = (task_pipeline, args.verbose1, args.verbose2)
+    all_success = True
 
-    # Check tasks are all pipeline tasks
-    invalid_tasks = [
-        type(task).__name__
-        for task in task_pipeline
-        if not issubclass(type(task), PipelineTask)
-    ]
-    if invalid_tasks:
-        print(f"error: the following pipeline tasks are invalid: {invalid_tasks}")
-        sys.exit(1)
+    for subtask in subtasks:
+        if subtask.global_batch:
+            all_success &= _run_batch_task(subtask, filenames)
+            if fail_fast and not all_success:
+                return False
+
+    if any(not subtask.global_batch for subtask in subtasks):
+        # Each worker gets one batch with a similar total cost and mix of file
+        # types so they finish together. Batch tasks (e.g., Lint) also run in
+        # the task pipeline, so its recorded times are used as costs.
+        filename_batches = _partition_by_cost(
+            filenames, jobs, _get_costs(filenames, "pipeline"), spread_suffixes=True
+        )
+
+        # Start worker processes for batch tasks
+        cache_updates = []
+        status = _Progress("batch", len(filenames), progress)
+        for batch, success, updates, output in pool.imap_unordered(
+            _proc_batch, filename_batches
+        ):
+            all_success &= success
+            cache_updates.append(updates)
+            status.clear()
+            _print_worker_output(output)
+            status.update(len(batch))
+
+            if fail_fast and not success:
+                status.clear()
+                _cancel_pool(pool)
+                break
+
+        _save_cache_updates(cache_updates)
 
-    with mp.Pool(args.jobs, _proc_init, init_args) as pool:
-        # Start worker processes for task pipeline
-        results = pool.map(_proc_pipeline, filenames)
+    return all_success
 
-    return all(results)
 
+def _run_standalone(
+    pool,
+    jobs: int,
+    filenames: list[Path],
+    cache: Cache | None = None,
+    include_graph: IncludeGraph | None = None,
+    progress: bool = False,
+    fail_fast: bool = False,
+) -> bool:
+    """Runs _proc_standalone() on process pool.
 
-def _run_batch(task_pipeline, args, filename_batches: list[list[Path]]) -> bool:
-    """Spawns process pool for _proc_batch().
+    Files whose cache key is unchanged since they were last checked aren't
+    checked again, and the diagnostics reported for them are replayed instead.
+
+    Diagnostics are printed as each batch finishes. Ones already printed (e.g.,
+    for a header included by files in several batches) are skipped.
 
     Keyword arguments:
-    task_pipeline -- task pipeline
-    args -- command line arguments from argparse
-    filename_batches -- list of batches of filenames to process
+    pool -- process pool
+    jobs -- number of worker processes
+    filenames -- list of filenames to process
+    cache -- standalone task cache or None if caching is disabled
+    include_graph -- include graph used for cache keys or None if caching is
+                     disabled
+    progress -- whether to print a progress line
+    fail_fast -- whether to cancel the pool when a task fails
 
     Returns true if all tasks succeeded.
     """
-    init_args = (task_pipeline, args.verbose1, args.verbose2)
+    all_success = True
+    diagnostics: list[tuple[str, int, str, str, str]] = []
+    printed: set[tuple[str, int, str, str]] = set()
 
-    # Check tasks are all batch tasks
-    invalid_tasks = [
-        type(task).__name__
-        for task in task_pipeline
-        if not issubclass(type(task), BatchTask)
-    ]
-    if invalid_tasks:
-        print(f"error: the following batch tasks are invalid: {invalid_tasks}")
-        sys.exit(1)
+    cache_keys: dict[Path, str] = {}
+    if cache and include_graph:
+        uncached_filenames = []
+        for filename in filenames:
+            config_file = Config.get(filename.parent)
+            keys = [
+                subtask.get_cache_key(config_file, filename, include_graph)
+                for subtask in task_pipelines[StandaloneTask]
+                if subtask.should_process_file(config_file, filename)
+            ]
+            if not keys:
+                # No task processes the file
+                continue
+            if None in keys:
+                uncached_filenames.append(filename)
+                continue
+
+            cache_key = hash_contents(*keys)
+            entry = cache.get(filename.as_posix())
+            if entry and entry[0] == cache_key:
+                diagnostics += [tuple(diagnostic) for diagnostic in entry[1]]
+                all_success &= not entry[1]
+            else:
+                uncached_filenames.append(filename)
+                cache_keys[filename] = cache_key
+        filenames = uncached_filenames
 
-    with mp.Pool(args.jobs, _proc_init, init_args) as pool:
-        # Start worker processes for batch tasks
-        results = pool.map(_proc_batch, filename_batches)
+    # Cached diagnostics are printed before any batches run
+    _print_standalone_diagnostics(diagnostics, printed)
+    if fail_fast and not all_success:
+        return False
+
+    # Several batches per worker let batched tasks amortize their startup
+    # while keeping the load balanced if the cost estimates are off
+    batches = _partition_by_cost(
+        filenames, jobs * 4, _get_costs(filenames, "standalone")
+    )
+
+    # Start worker processes for standalone tasks
+    status = _Progress("clang-tidy", len(filenames), progress)
+    cache_updates = []
+    for batch, success, batch_diagnostics, updates, output in pool.imap_unordered(
+        _proc_standalone, batches
+    ):
+        all_success &= success
+        cache_updates.append(updates)
+        status.clear()
+        _print_worker_output(output)
+        _print_standalone_diagnostics(batch_diagnostics, printed)
+        status.update(len(batch))
+
+        # Batches which failed without diagnostics (e.g., because a tool
+        # wasn't found) aren't cached
+        if cache and include_graph and (success or batch_diagnostics):
+            _cache_standalone_diagnostics(
+                cache, cache_keys, include_graph, batch, batch_diagnostics
+            )
+
+        if fail_fast and not success:
+            status.clear()
+            _cancel_pool(pool)
+            break
+    if cache:
+        cache.save()
+    _save_cache_updates(cache_updates)
+
+    return all_success
 
-    return all(results)
 
+def _print_standalone_diagnostics(
+    diagnostics: list[tuple[str, int, str, str, str]],
+    printed: set[tuple[str, int, str, str]],
+):
+    """Prints diagnostics grouped by file, skipping ones already printed.
 
-def _run_standalone(task_pipeline, args, filenames: list[Path]) -> bool:
-    """Spawns process pool for _proc_standalone().
+    Diagnostics in headers are reported once per file including them, so
+    they're deduplicated before being printed.
 
     Keyword arguments:
-    task_pipeline -- task pipeline
-    args -- command line arguments from argparse
-    filenames -- list of filenames to process
+    diagnostics -- list of (filename, line, check, message, text) tuples
+    printed -- set of (filename, line, check, message) keys already printed.
+               It's updated with the newly printed diagnostics.
+    """
+    file_diagnostics: dict[str, dict[tuple[int, str, str], str]] = {}
+    for filename, linenum, check, message, text in diagnostics:
+        key = (filename, linenum, check, message)
+        if key not in printed:
+            printed.add(key)
+            file_diagnostics.setdefault(filename, {})[(linenum, check, message)] = text
+
+    for filename, texts in sorted(file_diagnostics.items()):
+        print(
+            f"== clang-tidy {filename} ==\n"
+            + "\n".join(text for _, text in sorted(texts.items())),
+            flush=True,
+        )
 
-    Returns true if all tasks succeeded.
+
+def _cache_standalone_diagnostics(
+    cache: Cache,
+    cache_keys: dict[Path, str],
+    include_graph: IncludeGraph,
+    filenames: list[Path],
+    diagnostics: list[tuple[str, int, str, str, str]],
+):
+    """Records diagnostics reported for a batch of files in the cache.
+
+    Each diagnostic is attributed to the files in the batch which are or
+    include the file it's in. Diagnostics which can't be attributed that way
+    are attributed to every file in the batch.
+
+    Keyword arguments:
+    cache -- standalone task cache
+    cache_keys -- dictionary from filename to cache key
+    include_graph -- include graph
+    filenames -- batch of filenames
+    diagnostics -- diagnostics reported for the batch
     """
-    init_args = (task_pipeline, args.verbose1, args.verbose2)
+    dependencies = {
+        filename: {
+            str(dependency)
+            for dependency in include_graph.get_transitive_includes(filename)
+        }
+        | {str(filename)}
+        for filename in filenames
+        if filename in cache_keys
+    }
+
+    file_diagnostics: dict[Path, list[tuple[str, int, str, str, str]]] = {
+        filename: [] for filename in dependencies
+    }
+    for diagnostic in diagnostics:
+        owners = [
+            filename
+            for filename, sources in dependencies.items()
+            if diagnostic[0] in sources
+        ]
+        for filename in owners or dependencies:
+            file_diagnostics[filename].append(diagnostic)
+
+    for filename, owned_diagnostics in file_diagnostics.items():
+        cache.set(filename.as_posix(), [cache_keys[filename], owned_diagnostics])
+
 
-    # Check tasks are all standalone tasks
-    invalid_tasks = [
-        type(task).__name__
-        for task in task_pipeline
-        if not issubclass(type(task), StandaloneTask)
+def _get_tidy_changed_files(
+    clang_tidy: ClangTidy,
+    filenames: list[Path],
+    changed_filenames: list[Path],
+    include_graph: IncludeGraph,
+) -> list[Path]:
+    """Returns files to check with clang-tidy when only changes are checked.
+
+    Changed headers don't have compile commands, so each is replaced with a
+    small set of source files which include it. Headers no source file includes
+    are checked directly.
+
+    Keyword arguments:
+    clang_tidy -- ClangTidy task
+    filenames -- list of all files
+    changed_filenames -- list of changed files
+    include_graph -- include graph of the repository's C and C++ files
+    """
+    changed_files = set(filenames) & set(changed_filenames)
+    changed_headers = [
+        filename
+        for filename in changed_files
+        if Config.get(filename.parent).is_header_file(filename)
+        and filename.resolve() not in clang_tidy.commands
     ]
-    if invalid_tasks:
-        print(f"error: the following standalone tasks are invalid: {invalid_tasks}")
-        sys.exit(1)
+    if not changed_headers:
+        return list(changed_files)
+
+    sources = {
+        filename for filename in filenames if filename.resolve() in clang_tidy.commands
+    }
+    covering_sources, uncovered_headers = include_graph.get_covering_sources(
+        changed_headers, sources
+    )
+
+    return sorted(
+        (changed_files - set(changed_headers)) | covering_sources | uncovered_headers
+    )
+
 
-    with mp.Pool(args.jobs, _proc_init, init_args) as pool:
-        # Start worker processes for standalone tasks
-        results = pool.map(_proc_standalone, filenames)
+def _get_include_graph(filenames: list[Path], cache_dir: Path | None) -> IncludeGraph:
+    """Returns include graph of C and C++ files.
+
+    Keyword arguments:
+    filenames -- list of all unignored files, including generated ones
+    cache_dir -- directory for the include name cache or None if caching is
+                 disabled
+    """
+    cpp_filenames = [
+        filename
+        for filename in filenames
+        if Config.get(filename.parent).is_c_file(filename)
+        or Config.get(filename.parent).is_cpp_file(filename)
+    ]
 
-    return all(results)
+    cache = None
+    if cache_dir:
+        cache = Cache(cache_dir / "includes.json", get_environment())
+    include_graph = IncludeGraph(cpp_filenames, cache)
+    if cache:
+        cache.save()
+
+    return include_graph
 
 
 def main():
@@ -393,6 +1229,30 @@ def main():
         action="store_true",
         help="disable formatting steps, only run linting",
     )
+    parser.add_argument(
+        "-format-changed",
+        dest="format_changed",
+        action="store_true",
+        help="only run formatting steps on files changed from default branch, including files with uncommitted changes and untracked files",
+    )
+    parser.add_argument(
+        "-no-cache",
+        dest="no_cache",
+        action="store_true",
+        help="disable the cache of files known to be formatted and reprocess every file",
+    )
+    parser.add_argument(
+        "-fail-fast",
+        dest="fail_fast",
+        action="store_true",
+        help="stop processing files and exit with an error as soon as any task fails",
+    )
+    parser.add_argument(
+        "-progress",
+        dest="progress",
+        action="store_true",
+        help="print the number of files processed, files per second, and estimated time remaining to stderr during each phase",
+    )
     parser.add_argument(
         "--version",
         dest="version",
@@ -424,30 +1284,33 @@ def main():
 
     # If no files explicitly specified
     if not args.file:
-        # Recursively create list of files in given directory
-        filenames: list[Path] = [f for f in repo_root.rglob("*") if f.is_file()]
+        # Recursively create list of unignored files in repo
+        filenames: list[Path] = list(_list_unignored_files(repo_root))
 
         if not filenames:
             print("error: no files found to format", file=sys.stderr)
             sys.exit(1)
     else:
         filenames: list[Path] = []
+        explicit_filenames: list[Path] = []
         for elem in args.file:
             # If a directory was specified, recursively expand it
             if (path := Path(elem)).is_dir():
-                filenames.extend([f for f in path.rglob("*") if f.is_file()])
+                filenames.extend(_list_unignored_files(path))
             else:
-                filenames.append(path)
+                explicit_filenames.append(path)
 
-    # Skip ignored files before resolving symlinks in case resolved filepath is
-    # outside Git repo
-    filenames: list[Path] = _filter_for_unignored_files(filenames)
+        # Skip ignored files before resolving symlinks in case resolved
+        # filepath is outside Git repo
+        if explicit_filenames:
+            filenames.extend(_filter_for_unignored_files(explicit_filenames))
 
     # Convert relative filepaths to absolute and resolve symlinks
     filenames: list[Path] = [f.resolve() for f in filenames]
 
     # Skip Git metadata
     filenames: list[Path] = [f for f in filenames if ".git" not in f.parts]
+    unignored_filenames = filenames
 
     # Throw an error if any files or directories don't exist
     for f in filenames:
@@ -487,10 +1350,7 @@ def main():
     # Skip modifiable or generated files
     work: list[Path] = []
     for filename in filenames:
-        # TODO: Remove handling for deprecated .styleguide file
-        config_file = Config(filename.parent, Path(".wpiformat"))
-        if config_file.filename == "<none found>":
-            config_file = Config(filename.parent, Path(".styleguide"))
+        config_file = Config.get(filename.parent)
 
         # Skip files with significant trailing whitespace
         if filename.suffix in [
@@ -552,51 +1412,168 @@ def main():
             print(f)
         sys.exit(0)
 
-    # Prepare file batches for batch tasks
-    chunksize = math.ceil(len(filenames) / args.jobs)
-    file_batches = [
-        filenames[i : i + chunksize] for i in range(0, len(filenames), chunksize)
-    ]
+    # Restrict formatting steps to changed files if requested
+    if args.format_changed:
+        format_file_set = set(changed_file_list) | {
+            (repo_root / name).resolve()
+            for name in Task.get_uncommitted_files(repo_root)
+        }
+        format_filenames = [f for f in filenames if f in format_file_set]
+    else:
+        format_filenames = filenames
+
+    # Caches workers update are sent back to this process to be saved
+    caches: dict[str, Cache] = {}
+    cache_dir = None if args.no_cache else get_cache_dir(repo_root)
+    if cache_dir:
+        caches["lint"] = Cache(cache_dir / "lint.json", get_environment())
+
+        # Recorded times are only used to schedule work, so they're kept when
+        # wpiformat or the tools change
+        caches["timings"] = Cache(cache_dir / "timings.json", "")
 
-    all_success = True
     if args.no_format:
         # Only run Lint
-        task_pipeline = [Lint()]
-        all_success &= _run_batch(task_pipeline, args, file_batches)
+        task_pipelines = {PipelineTask: [], BatchTask: [Lint(caches.get("lint"))]}
     else:
-        # ClangFormat is run after the other tasks so it can clean up their
-        # formatting.
-        task_pipeline = [
-            BraceComment(),
-            CIdentList(),
-            EofNewline(),
-            IncludeGuard(),
-            LicenseUpdate(),
-            JavaClass(),
-            UsingDeclaration(),
-            UsingNamespaceStd(),
-            Whitespace(),
-            ClangFormat(),
-            Jni(),  # Fixes clang-format formatting
-        ]
-        all_success &= _run_pipeline(task_pipeline, args, filenames)
-
-        # Lint is run last since previous tasks can affect its output.
-        task_pipeline = [CMakeFormat(), PyFormat(), Lint()]
-
-        all_success &= _run_batch(task_pipeline, args, file_batches)
+        # Look up when all files were last modified up front so LicenseUpdate
+        # doesn't have to query Git for each file
+        license_filenames: list[Path] = []
+        for filename in format_filenames:
+            config_file = Config.get(filename.parent)
+
+            if LicenseUpdate.should_process_file(config_file, filename):
+                license_filenames.append(filename)
+        last_years = LicenseUpdate.get_last_years(repo_root, license_filenames)
+
+        task_pipelines = {
+            # ClangFormat is run after the other tasks so it can clean up their
+            # formatting. Lint is run last since previous tasks can affect its
+            # output; it checks the final contents in memory.
+            PipelineTask: [
+                BraceComment(),
+                CIdentList(),
+                EofNewline(),
+                IncludeGuard(),
+                LicenseUpdate(last_years),
+                JavaClass(),
+                UsingDeclaration(),
+                UsingNamespaceStd(),
+                Whitespace(),
+                ClangFormat(),
+                Jni(),  # Fixes clang-format formatting
+                Lint(caches.get("lint")),
+            ],
+            BatchTask: [
+                CMakeFormat(args.jobs),
+                PyFormat(args.jobs, cache_dir / "ruff" if cache_dir else None),
+            ],
+        }
 
     # ClangTidy is run last of all; it needs the actual files
+    task_pipelines[StandaloneTask] = []
     if args.tidy_all or args.tidy_changed:
-        if args.tidy_changed:
-            filenames = list(set(filenames) & set(changed_file_list))
-        task_pipeline = [
-            ClangTidy(
+        try:
+            clang_tidy = ClangTidy(
                 args.compile_commands,
                 args.tidy_extra_args.split(",") if args.tidy_extra_args else [],
             )
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(
+                f"error: clang-tidy: failed to load {compile_commands_filename}: {e}",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        task_pipelines[StandaloneTask].append(clang_tidy)
+
+    # Check tasks are all of the type their phase requires
+    for task_type, phase_name in [
+        (PipelineTask, "pipeline"),
+        (BatchTask, "batch"),
+        (StandaloneTask, "standalone"),
+    ]:
+        invalid_tasks = [
+            type(task).__name__
+            for task in task_pipelines[task_type]
+            if not issubclass(type(task), task_type)
         ]
-        all_success &= _run_standalone(task_pipeline, args, filenames)
+        if invalid_tasks:
+            print(
+                f"error: the following {phase_name} tasks are invalid: {invalid_tasks}"
+            )
+            sys.exit(1)
+
+    # Cached results are invalidated when the tools, the task pipeline, or the
+    # year (used by LicenseUpdate) change
+    if cache_dir:
+        caches["pipeline"] = Cache(
+            cache_dir / "pipeline.json",
+            get_environment(
+                *[type(task).__name__ for task in task_pipelines[PipelineTask]],
+                str(date.today().year),
+            ),
+        )
+
+    # Standalone task results are cached per file, keyed on the file and
+    # everything it includes
+    tidy_filenames = filenames
+    tidy_cache = None
+    include_graph = None
+    if task_pipelines[StandaloneTask]:
+        if cache_dir:
+            tidy_cache = Cache(cache_dir / "tidy.json", get_environment())
+        if tidy_cache or args.tidy_changed:
+            # The graph covers generated files too since files which are checked
+            # can include them
+            if args.file:
+                graph_filenames = [
+                    f.resolve() for f in _list_unignored_files(repo_root)
+                ]
+            else:
+                graph_filenames = unignored_filenames
+            include_graph = _get_include_graph(graph_filenames, cache_dir)
+        if args.tidy_changed:
+            tidy_filenames = _get_tidy_changed_files(
+                clang_tidy, filenames, changed_file_list, include_graph
+            )
+
+    # One process pool is shared by all phases so worker startup is only paid
+    # once per run
+    init_args = (task_pipelines, args.verbose1, args.verbose2, caches)
+
+    # Globally batched tasks run in this process, so it needs the same state as
+    # the workers
+    _proc_init(*init_args)
+
+    # With -fail-fast, each worker gets its own process group so the tools it
+    # runs can be killed with it
+    with mp.Pool(args.jobs, _proc_worker_init, (args.fail_fast, *init_args)) as pool:
+        all_success = True
+        if task_pipelines[PipelineTask]:
+            all_success &= _run_pipeline(
+                pool, args.jobs, format_filenames, args.progress, args.fail_fast
+            )
+
+        if all_success or not args.fail_fast:
+            all_success &= _run_batch(
+                pool,
+                args.jobs,
+                task_pipelines[BatchTask],
+                format_filenames,
+                args.progress,
+                args.fail_fast,
+            )
+
+        if task_pipelines[StandaloneTask] and (all_success or not args.fail_fast):
+            all_success &= _run_standalone(
+                pool,
+                args.jobs,
+                tidy_filenames,
+                tidy_cache,
+                include_graph,
+                args.progress,
+                args.fail_fast,
+            )
 
     if not all_success:
         sys.exit(1)
@@ -0,0 +1,164 @@
+"""Handles persistent caches that are kept between wpiformat runs."""
+
+import hashlib
+import json
+import os
+import subprocess
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Any
+
+
+class Cache:
+    def __init__(self, filename: Path | None, environment: str):
+        """Constructor for Cache object.
+
+        The cache is loaded from the given file. If the environment key stored
+        in the file doesn't match the given one (e.g., because a tool was
+        upgraded), the stored entries are discarded.
+
+        Keyword arguments:
+        filename -- cache filename or None to disable persistence
+        environment -- key describing everything entries implicitly depend on
+        """
+        self.filename = filename
+        self.environment = environment
+
+        # Entries loaded from disk or set during this run
+        self.entries: dict[str, Any] = {}
+
+        # Entries set since the last call to pop_updates()
+        self.updates: dict[str, Any] = {}
+
+        if filename is None:
+            return
+
+        try:
+            data = json.loads(filename.read_text(encoding="utf-8"))
+            if data["environment"] == environment:
+                self.entries = data["entries"]
+        except (OSError, ValueError, KeyError, TypeError):
+            # A missing or corrupt cache is treated as empty
+            pass
+
+    def get(self, key: str) -> Any:
+        """Returns value for key or None if key isn't in the cache.
+
+        Keyword arguments:
+        key -- entry key
+        """
+        return self.entries.get(key)
+
+    def set(self, key: str, value: Any):
+        """Sets value for key.
+
+        Keyword arguments:
+        key -- entry key
+        value -- JSON-serializable entry value
+        """
+        self.entries[key] = value
+        self.updates[key] = value
+
+    def pop_updates(self) -> dict[str, Any]:
+        """Returns entries set since the last call and clears them.
+
+        This is used by process pool workers to send new entries back to the
+        parent process, which owns the cache file.
+        """
+        updates = self.updates
+        self.updates = {}
+        return updates
+
+    def merge(self, updates: dict[str, Any]):
+        """Merges entries returned by pop_updates() into this cache.
+
+        Keyword arguments:
+        updates -- dictionary of entries
+        """
+        self.entries.update(updates)
+        self.updates.update(updates)
+
+    def save(self):
+        """Writes the cache to disk if it was modified."""
+        if self.filename is None or not self.updates:
+            return
+
+        try:
+            self.filename.parent.mkdir(parents=True, exist_ok=True)
+
+            # Write to a temporary file first so concurrent runs never read a
+            # partially written cache
+            temp_filename = self.filename.with_name(
+                f"{self.filename.name}.{os.getpid()}.tmp"
+            )
+            temp_filename.write_text(
+                json.dumps({"environment": self.environment, "entries": self.entries}),
+                encoding="utf-8",
+            )
+            temp_filename.replace(self.filename)
+        except OSError:
+            # Failing to save the cache only makes the next run slower
+            return
+
+        self.updates = {}
+
+
+def get_cache_dir(repo_root: Path) -> Path | None:
+    """Returns directory in which wpiformat caches are stored.
+
+    Caches are stored in the Git directory so they're never processed or
+    committed. Returns None if the Git directory couldn't be found.
+
+    Keyword arguments:
+    repo_root -- Git repository root
+    """
+    proc = subprocess.run(
+        ["git", "rev-parse", "--git-common-dir"],
+        cwd=repo_root,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        encoding="utf-8",
+        check=False,
+    )
+    if proc.returncode != 0 or not (git_dir := proc.stdout.rstrip()):
+        return None
+    return (repo_root / git_dir).resolve() / "wpiformat"
+
+
+def hash_contents(*contents: str | bytes) -> str:
+    """Returns hex digest of the given strings.
+
+    Keyword arguments:
+    *contents -- strings to hash
+    """
+    h = hashlib.sha256()
+    for content in contents:
+        if isinstance(content, str):
+            content = content.encode()
+
+        # Prefix each element with its length so element boundaries are part
+        # of the hash
+        h.update(len(content).to_bytes(8, "little"))
+        h.update(content)
+    return h.hexdigest()
+
+
+def get_environment(*extra: str) -> str:
+    """Returns cache environment key for the current wpiformat installation.
+
+    The key covers wpiformat's own source code and the versions of the tools it
+    runs.
+
+    Keyword arguments:
+    *extra -- additional strings the cache depends on
+    """
+    sources = [f.read_bytes() for f in sorted(Path(__file__).parent.glob("*.py"))]
+
+    tool_versions = []
+    for package in ["clang-format", "clang-tidy", "cpplint", "gersemi", "ruff"]:
+        try:
+            tool_versions.append(f"{package}=={version(package)}")
+        except PackageNotFoundError:
+            tool_versions.append(f"{package}==<none>")
+
+    return hash_contents(*sources, *tool_versions, *extra)
@@ -6,12 +6,36 @@ Runs on: C
 
 import re
 from pathlib import Path
+from typing import ClassVar
 
 from wpiformat.config import Config
-from wpiformat.task import PipelineTask
+from wpiformat.task import PipelineEditTask
+from wpiformat.tokenizer import Tokenizer
+
+
+class CIdentList(PipelineEditTask):
+    # Tokenize as extern "C" or extern "C++" with optional {, open brace,
+    # close brace, or () folllowed by { to disambiguate function calls.
+    # extern is first to try matching a brace to it before classifying the
+    # brace as generic.
+    #
+    # Valid function prototypes and definitions have return type, spaces,
+    # function name, optional spaces, then braces. They are followed by ; or
+    # {.
+    #
+    # "def\\s+\w+" matches preprocessor directives "#ifdef" and "#ifndef" so
+    # their contents aren't used as a return type.
+    #
+    # "\w+\**\s+\w+\s*" matches a function return type with 0 or more
+    # trailing asterisks, spaces, a function name, then spaces before the
+    # open parenthesis
+    __token_regex: ClassVar[re.Pattern] = re.compile(
+        r"#else|#endif|"
+        r"(?P<ext_decl>extern \"C(\+\+)?\")\s+(?P<ext_brace>\{)?|"
+        r"\{|\}|;|def\s+\w+|\w+\**\s+\w+\s*(?P<paren>\(\))"
+        r"(?=\s*(;|\{))"
+    )
 
-
-class CIdentList(PipelineTask):
     @staticmethod
     def __print_failure(filename):
         print(
@@ -24,60 +48,14 @@ class CIdentList(PipelineTask):
     def should_process_file(config_file: Config, filename: Path) -> bool:
         return config_file.is_c_file(filename) or config_file.is_cpp_file(filename)
 
-    @staticmethod
-    def is_quote_in_number(lines: str, i: int) -> bool:
-        if i == 0:
-            return False
-        c = lines[i - 1]
-        return (
-            ord("0") <= ord(c) <= ord("9")
-            or ord("A") <= ord(c) <= ord("F")
-            or ord("a") <= ord(c) <= ord("f")
-        )
-
-    def run_pipeline(
+    def run_pipeline_edits(
         self, config_file: Config, filename: Path, lines: str
-    ) -> tuple[str, bool]:
-        linesep = super().get_linesep(lines)
-
-        output = ""
-        pos = 0
+    ) -> tuple[list[tuple[int, int, str]], bool]:
+        edits = []
 
         # C files use C linkage by default
         is_c: int = 1 if config_file.is_c_file(filename) else 0
 
-        # Tokenize as extern "C" or extern "C++" with optional {, open brace,
-        # close brace, or () folllowed by { to disambiguate function calls.
-        # extern is first to try matching a brace to it before classifying the
-        # brace as generic.
-        #
-        # Valid function prototypes and definitions have return type, spaces,
-        # function name, optional spaces, then braces. They are followed by ; or
-        # {.
-        #
-        # "def\\s+\w+" matches preprocessor directives "#ifdef" and "#ifndef" so
-        # their contents aren't used as a return type.
-        #
-        # "\w+\**\s+\w+\s*" matches a function return type with 0 or more
-        # trailing asterisks, spaces, a function name, then spaces before the
-        # open parenthesis
-        preproc_str = r"#else|#endif|"
-        comment_str = r"/\*|\*/|//|" + linesep + r"|"
-        string_str = r"\\\\|\\\"|\"|"
-        char_str = r"\\'|'|"
-        extern_str = r"(?P<ext_decl>extern \"C(\+\+)?\")\s+(?P<ext_brace>\{)?|"
-        braces_str = r"\{|\}|;|def\s+\w+|\w+\**\s+\w+\s*(?P<paren>\(\))"
-        postfix_str = r"(?=\s*(;|\{))"
-        token_regex = re.compile(
-            preproc_str
-            + comment_str
-            + string_str
-            + char_str
-            + extern_str
-            + braces_str
-            + postfix_str
-        )
-
         EXTRA_POP_OFFSET = 2
 
         # If value is greater than pop offset, the value needs to be restored in
@@ -89,11 +67,7 @@ class CIdentList(PipelineTask):
         extern_brace_indices = [is_c]
 
         in_preproc_else = False
-        in_multicomment = False
-        in_singlecomment = False
-        in_string = False
-        in_char = False
-        for match in token_regex.finditer(lines):
+        for match in Tokenizer.get(lines).code_matches(self.__token_regex):
             token = match.group()
 
             # Skip #else to #endif in case they have braces in them. This
@@ -108,48 +82,14 @@ class CIdentList(PipelineTask):
             if in_preproc_else:
                 continue
 
-            if token == "/*":
-                if not in_singlecomment and not in_string and not in_char:
-                    in_multicomment = True
-            elif token == "*/":
-                if not in_singlecomment and not in_string and not in_char:
-                    in_multicomment = False
-            elif token == "//":
-                if not in_multicomment and not in_string and not in_char:
-                    in_singlecomment = True
-            elif in_singlecomment and linesep in token:
-                # Ignore token if it's in a singleline comment. Only check it
-                # for newlines to end the comment.
-                in_singlecomment = False
-            elif in_multicomment or in_singlecomment:
-                # Tokens processed after this branch are ignored if they are in
-                # comments
-                continue
-            elif token == '\\"':
-                continue
-            elif token == '"':
-                if not in_char:
-                    in_string = not in_string
-            elif token == "\\'":
-                continue
-            elif token == "'":
-                if in_string:
-                    continue
-                if not in_char and self.is_quote_in_number(lines, match.start()):
-                    continue
-                in_char = not in_char
-            elif in_string or in_char:
-                # Tokens processed after this branch are ignored if they are in
-                # double or single quotes
-                continue
-            elif token == "{":
+            if token == "{":
                 extern_brace_indices.append(is_c)
             elif token == "}":
                 is_c = extern_brace_indices.pop()
 
                 if len(extern_brace_indices) == 0:
                     self.__print_failure(filename)
-                    return lines, False
+                    return [], False
 
                 # If the next stack frame is from an extern without braces, pop
                 # it.
@@ -159,7 +99,7 @@ class CIdentList(PipelineTask):
             elif token == ";":
                 if len(extern_brace_indices) == 0:
                     self.__print_failure(filename)
-                    return lines, False
+                    return [], False
 
                 # If the next stack frame is from an extern without braces, pop
                 # it.
@@ -185,16 +125,11 @@ class CIdentList(PipelineTask):
                     is_c = False
             elif match.group("paren") and "return " not in match.group() and is_c:
                 # Replaces () with (void)
-                output += lines[pos : match.span("paren")[0]] + "(void)"
-                pos = match.span("paren")[0] + len("()")
-
-        # Write rest of file if it wasn't all processed
-        if pos < len(lines):
-            output += lines[pos:]
+                edits.append((match.start("paren"), match.end("paren"), "(void)"))
 
         # Invariant: extern_brace_indices has one entry
         success = len(extern_brace_indices) == 1
         if not success:
             self.__print_failure(filename)
 
-        return output, success
+        return edits, success
@@ -6,6 +6,7 @@ Runs on: C, C++
 
 import subprocess
 import sys
+import tempfile
 from pathlib import Path
 
 import clang_format
@@ -15,6 +16,9 @@ from wpiformat.task import PipelineTask
 
 
 class ClangFormat(PipelineTask):
+    # Files in a chunk are formatted in place by one clang-format process
+    batch_pipeline = True
+
     def __init__(self):
         """Constructor for ClangFormat task."""
         super().__init__()
@@ -52,3 +56,94 @@ class ClangFormat(PipelineTask):
             return lines, False
 
         return stdout, True
+
+    def run_pipeline_batch(
+        self, files: list[tuple[Config, Path, str]]
+    ) -> list[tuple[str, bool]]:
+        results: list[tuple[str, bool] | None] = [None] * len(files)
+
+        # Group files by the style file clang-format would use for them
+        groups: dict[Path, list[int]] = {}
+        for i, (config_file, filename, lines) in enumerate(files):
+            style_file = self.__find_style_file(filename)
+            if style_file is None:
+                results[i] = self.run_pipeline(config_file, filename, lines)
+            else:
+                groups.setdefault(style_file, []).append(i)
+
+        for style_file, indices in groups.items():
+            outputs = self.__run_in_place(style_file, [files[i] for i in indices])
+            for i, output in zip(indices, outputs):
+                if output is None:
+                    results[i] = self.run_pipeline(*files[i])
+                else:
+                    results[i] = output, True
+
+        return results
+
+    @staticmethod
+    def __find_style_file(filename: Path) -> Path | None:
+        """Returns style file clang-format uses for a file.
+
+        Returns None if the style file couldn't be found in the repository or
+        it inherits from a parent style file, since the file's original location
+        is needed to resolve it then.
+
+        Keyword arguments:
+        filename -- filename
+        """
+        style_file = None
+        style_contents = []
+        for name in [".clang-format", "_clang-format"]:
+            try:
+                filepath, contents = Config.read_file(filename.parent, Path(name))
+            except OSError:
+                continue
+
+            # The style file nearest to the file wins
+            if style_file is None or len(filepath.parents) > len(style_file.parents):
+                style_file = filepath
+                style_contents = contents
+
+        if any("InheritParentConfig" in line for line in style_contents):
+            return None
+        return style_file
+
+    def __run_in_place(
+        self, style_file: Path, files: list[tuple[Config, Path, str]]
+    ) -> list[str | None]:
+        """Formats copies of files in place with one clang-format process.
+
+        Keyword arguments:
+        style_file -- style file to use for all files
+        files -- list of (config_file, filename, lines) tuples
+
+        Returns list of formatted file contents. If clang-format failed, every
+        element is None so the files can be formatted individually to attribute
+        the error.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_filenames = []
+            for i, (_, filename, lines) in enumerate(files):
+                # Each copy gets its own directory so copies keep the original
+                # filename (clang-format uses it to detect the language and main
+                # include) without colliding
+                temp_filename = Path(temp_dir) / str(i) / filename.name
+                temp_filename.parent.mkdir()
+                temp_filename.write_text(lines, encoding="utf-8")
+                temp_filenames.append(temp_filename)
+
+            try:
+                p = subprocess.run(
+                    [self.exec_name, f"-style=file:{style_file}", "-i"]
+                    + temp_filenames,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    check=False,
+                )
+            except FileNotFoundError:
+                return [None] * len(files)
+            if p.returncode != 0:
+                return [None] * len(files)
+
+            return [f.read_text(encoding="utf-8") for f in temp_filenames]
@@ -4,31 +4,72 @@ This task runs clang-tidy.
 Runs on: C, C++
 """
 
+import json
+import os
+import re
+import shlex
 import subprocess
 import sys
+import tempfile
 from pathlib import Path
+from typing import Any, ClassVar
 
 import clang_tidy
 
+from wpiformat.cache import hash_contents
 from wpiformat.config import Config
+from wpiformat.includegraph import IncludeGraph
 from wpiformat.task import StandaloneTask
 
 
 class ClangTidy(StandaloneTask):
+    # Compiler flags which add an include directory. MSVC's /I flag is only
+    # recognized on Windows since absolute POSIX paths can start with "/I".
+    __include_flags: ClassVar[tuple[str, ...]] = (
+        "-isystem",
+        "-iquote",
+        "-idirafter",
+        "-I",
+    ) + (("/I",) if sys.platform == "win32" else ())
+
+    # Matches the first line of a diagnostic
+    __diagnostic_regex: ClassVar[re.Pattern] = re.compile(
+        r"^(?P<path>.+?):(?P<line>\d+):\d+: (?P<severity>warning|error|note|remark): "
+        r"(?P<message>.*?)(?: \[(?P<check>[^\]]+)\])?$"
+    )
+
     def __init__(self, compile_commands: str, extra_args: list[str]):
         """Constructor for ClangTidy task.
 
+        The compilation database is loaded once here instead of being parsed
+        by every clang-tidy process. Each clang-tidy process is given a
+        database containing only the entries for the files it checks.
+
         Keyword arguments:
         compile_commands -- directory containing compile_commands.json
         extra_args -- list of extra arguments to clang-tidy
+
+        Raises OSError or ValueError if compile_commands.json couldn't be read.
         """
         super().__init__()
 
         self.exec_name = clang_tidy._get_executable("clang-tidy")
 
+        self.compile_commands_dir = Path(compile_commands).resolve()
+        self.commands = self.load_compile_commands(
+            self.compile_commands_dir / "compile_commands.json"
+        )
+
+        # Directories compile commands are run from
+        self.directories = sorted(
+            {
+                Path(entry["directory"])
+                for entries in self.commands.values()
+                for entry in entries
+            }
+        )
+
         self.args = ["--quiet"]
-        if compile_commands:
-            self.args += ["-p", compile_commands]
 
         # Prepend a dash to the argument here because the main argument parser
         # treats strings with a dash prefix as a new argument instead of the
@@ -36,19 +77,71 @@ class ClangTidy(StandaloneTask):
         for arg in extra_args:
             self.args += ["-extra-arg", "-" + arg]
 
+        # Diagnostics reported since the last call to pop_diagnostics()
+        self.diagnostics: list[tuple[str, int, str, str, str]] = []
+
+        # Memoized inputs of cache keys
+        self.__database_hash: str | None = None
+        self.__file_hashes: dict[Path, str] = {}
+        self.__config_contents: dict[Path, list[str]] = {}
+        self.__all_include_dirs: list[Path] | None = None
+
+    @staticmethod
+    def load_compile_commands(filename: Path) -> dict[Path, list[dict[str, Any]]]:
+        """Returns compilation database entries indexed by source file.
+
+        Keyword arguments:
+        filename -- compile_commands.json filename
+
+        Raises OSError or ValueError if the file couldn't be read.
+        """
+        with open(filename, encoding="utf-8") as f:
+            entries = json.load(f)
+
+        commands: dict[Path, list[dict[str, Any]]] = {}
+        for entry in entries:
+            source = (Path(entry["directory"]) / entry["file"]).resolve()
+            commands.setdefault(source, []).append(entry)
+        return commands
+
     @staticmethod
     def should_process_file(config_file: Config, filename: Path) -> bool:
         return config_file.is_cpp_file(filename)
 
     def run_standalone(self, config_file: Config, filename: Path) -> bool:
+        return self.run_standalone_batch([(config_file, filename)])
+
+    def run_standalone_batch(self, files: list[tuple[Config, Path]]) -> bool:
+        sources: list[Path] = []
+        commands: list[dict[str, Any]] = []
+        headers: list[Path] = []
+        for config_file, filename in files:
+            if (entries := self.commands.get(filename.resolve())) is not None:
+                sources.append(filename)
+                commands += entries
+            elif config_file.is_header_file(filename):
+                headers.append(filename)
+            else:
+                print(
+                    f"warning: clang-tidy: {filename} has no entry in {self.compile_commands_dir / 'compile_commands.json'}"
+                )
+
+        all_success = True
         try:
-            stdout = subprocess.run(
-                [self.exec_name] + self.args + [filename],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                encoding="utf-8",
-                check=False,
-            ).stdout
+            if sources:
+                with tempfile.TemporaryDirectory() as compile_commands_dir:
+                    with open(
+                        Path(compile_commands_dir) / "compile_commands.json",
+                        "w",
+                        encoding="utf-8",
+                    ) as f:
+                        json.dump(commands, f)
+                    all_success &= self.__run(Path(compile_commands_dir), sources)
+
+            # Headers usually don't have entries, so clang-tidy infers their
+            # compile command from the full database
+            if headers:
+                all_success &= self.__run(self.compile_commands_dir, headers)
         except FileNotFoundError:
             print(
                 f"error: {self.exec_name} not found in PATH. Is it installed?",
@@ -56,6 +149,45 @@ class ClangTidy(StandaloneTask):
             )
             return False
 
+        return all_success
+
+    def __run(self, compile_commands_dir: Path, filenames: list[Path]) -> bool:
+        """Runs clang-tidy on files and records its diagnostics.
+
+        The files are split between as few processes as the command line
+        length limit allows.
+
+        Keyword arguments:
+        compile_commands_dir -- directory containing compile_commands.json
+        filenames -- list of filenames
+
+        Returns True if clang-tidy reported nothing.
+        """
+        cmd = [self.exec_name, "-p", str(compile_commands_dir)] + self.args
+        max_len = self.get_max_args_len() - sum(len(str(arg)) + 1 for arg in cmd)
+
+        all_success = True
+        for chunk in self.chunk_args(filenames, max_len):
+            all_success &= self.__run_process(cmd, chunk)
+        return all_success
+
+    def __run_process(self, cmd: list[str], filenames: list[Path]) -> bool:
+        """Runs one clang-tidy process on files and records its diagnostics.
+
+        Keyword arguments:
+        cmd -- clang-tidy command without the filenames
+        filenames -- list of filenames
+
+        Returns True if clang-tidy reported nothing.
+        """
+        stdout = subprocess.run(
+            cmd + filenames,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            encoding="utf-8",
+            check=False,
+        ).stdout
+
         lines = [line for line in stdout.rstrip().split("\n") if line]
 
         # Filter out "X error(s) and Y warning(s) generated." lines
@@ -79,9 +211,163 @@ class ClangTidy(StandaloneTask):
                 filtered_lines.append(line)
         lines = filtered_lines
 
-        # If any lines are non-empty, print them and report an error
-        if any(len(line.rstrip()) > 0 for line in lines):
-            print(f"== clang-tidy {filename} ==\n" + "\n".join(lines))
-            return False
+        # clang-tidy prints the diagnostics for all files after processing
+        # them, so they're attributed to files by the location of each
+        # diagnostic. Notes stay with the diagnostic they belong to. Output
+        # before the first diagnostic is attributed to every file.
+        name = " ".join(str(filename) for filename in filenames)
+        key = (name, 0, "", "")
+        diagnostics: dict[tuple[str, int, str, str], list[str]] = {}
+        for line in lines:
+            match = self.__diagnostic_regex.match(line)
+            if match and match.group("severity") != "note":
+                key = (
+                    str(self.__resolve(match.group("path"))),
+                    int(match.group("line")),
+                    match.group("check") or "",
+                    match.group("message"),
+                )
+            diagnostics.setdefault(key, []).append(line)
+
+        # If any lines are non-empty, record them and report an error
+        all_success = True
+        for key, lines in diagnostics.items():
+            if any(len(line.rstrip()) > 0 for line in lines):
+                self.diagnostics.append((*key, "\n".join(lines)))
+                all_success = False
+
+        return all_success
+
+    def get_cache_key(
+        self, config_file: Config, filename: Path, include_graph: IncludeGraph
+    ) -> str | None:
+        commands = self.commands.get(filename.resolve())
+        if commands is not None:
+            database = json.dumps(commands, sort_keys=True)
+        elif config_file.is_header_file(filename):
+            # clang-tidy infers the header's compile command from the full
+            # database
+            if self.__database_hash is None:
+                self.__database_hash = self.__hash_file(
+                    self.compile_commands_dir / "compile_commands.json"
+                )
+            database = self.__database_hash
+        else:
+            # Files without an entry aren't checked
+            return None
+
+        inputs = []
+        for source in sorted(include_graph.get_transitive_includes(filename)):
+            inputs += [source.as_posix(), self.__hash_file(source)]
+
+        # Headers outside the graph (e.g., generated or in the build tree) are
+        # found with the compile command's include directories. Names which
+        # weren't found are part of the key so adding the header invalidates
+        # the entry.
+        if commands is not None:
+            include_dirs = self.__get_include_dirs(commands)
+        else:
+            if self.__all_include_dirs is None:
+                self.__all_include_dirs = self.__get_include_dirs(
+                    [entry for entries in self.commands.values() for entry in entries]
+                )
+            include_dirs = self.__all_include_dirs
+        for name, header in sorted(
+            include_graph.get_external_includes(filename, include_dirs),
+            key=lambda include: (include[0], str(include[1])),
+        ):
+            if header is None:
+                inputs += [name, "<not found>"]
+            else:
+                inputs += [name, header.as_posix(), self.__hash_file(header)]
+
+        return hash_contents(
+            *self.args,
+            database,
+            *self.__get_config_contents(filename.parent),
+            filename.as_posix(),
+            self.__hash_file(filename),
+            *inputs,
+        )
+
+    @classmethod
+    def __get_include_dirs(cls, entries: list[dict[str, Any]]) -> list[Path]:
+        """Returns include directories from compile commands in search order.
+
+        Keyword arguments:
+        entries -- list of compilation database entries
+        """
+        include_dirs: dict[Path, None] = {}
+        for entry in entries:
+            if "arguments" in entry:
+                args = entry["arguments"]
+            else:
+                args = shlex.split(entry["command"], posix=sys.platform != "win32")
+
+            directory = Path(entry["directory"])
+            for i, arg in enumerate(args):
+                for flag in cls.__include_flags:
+                    if arg == flag and i + 1 < len(args):
+                        include_dir = args[i + 1]
+                    elif arg.startswith(flag) and arg != flag:
+                        include_dir = arg[len(flag) :]
+                    else:
+                        continue
+                    include_dirs.setdefault(
+                        Path(os.path.normpath(directory / include_dir.strip('"')))
+                    )
+                    break
+        return list(include_dirs)
 
-        return True
+    def __hash_file(self, filename: Path) -> str:
+        """Returns hash of file contents.
+
+        Keyword arguments:
+        filename -- filename
+        """
+        if (file_hash := self.__file_hashes.get(filename)) is None:
+            try:
+                file_hash = hash_contents(filename.read_bytes())
+            except OSError:
+                file_hash = "<unreadable>"
+            self.__file_hashes[filename] = file_hash
+        return file_hash
+
+    def __get_config_contents(self, directory: Path) -> list[str]:
+        """Returns names and contents of .clang-tidy files which apply to a
+        directory.
+
+        Every .clang-tidy file in the directory's parents is included since
+        they can inherit from each other.
+
+        Keyword arguments:
+        directory -- directory
+        """
+        if (contents := self.__config_contents.get(directory)) is None:
+            contents = []
+            if directory.parent != directory:
+                contents += self.__get_config_contents(directory.parent)
+
+            config = directory / ".clang-tidy"
+            if config.is_file():
+                contents += [config.as_posix(), self.__hash_file(config)]
+            self.__config_contents[directory] = contents
+        return contents
+
+    def pop_diagnostics(self) -> list[tuple[str, int, str, str, str]]:
+        diagnostics = self.diagnostics
+        self.diagnostics = []
+        return diagnostics
+
+    def __resolve(self, path: str) -> Path:
+        """Returns absolute path of file named in a diagnostic.
+
+        clang-tidy prints paths relative to the compile command's directory.
+
+        Keyword arguments:
+        path -- path from diagnostic
+        """
+        for directory in self.directories:
+            if (directory / path).exists():
+                return (directory / path).resolve()
+        return Path(path)
@@ -4,7 +4,6 @@ This task runs gersemi.
 Runs on: CMake
 """
 
-import subprocess
 import sys
 from pathlib import Path
 
@@ -13,18 +12,48 @@ from wpiformat.task import BatchTask
 
 
 class CMakeFormat(BatchTask):
+    # gersemi formats files in parallel itself. It's run through its Python
+    # entry point, so starting an interpreter and importing gersemi is only
+    # paid once per run.
+    global_batch = True
+    in_process = True
+
+    def __init__(self, jobs: int = 1):
+        """Constructor for CMakeFormat task.
+
+        Keyword arguments:
+        jobs -- number of files gersemi formats in parallel
+        """
+        super().__init__()
+
+        self.jobs = jobs
+
     @staticmethod
     def should_process_file(config_file: Config, filename: Path) -> bool:
         return filename.name == "CMakeLists.txt" or filename.suffix == ".cmake"
 
-    @staticmethod
-    def run_batch(config_file: Config, filenames: list[Path]) -> bool:
+    def run_batch(self, config_file: Config, filenames: list[Path]) -> bool:
         try:
-            args = [sys.executable, "-m", "gersemi", "-i", "--no-color", "-q"]
-            subprocess.check_call(args + [f.as_posix() for f in filenames])
-        except FileNotFoundError:
-            print("error: gersemi not found in PATH. Is it installed?", file=sys.stderr)
+            import gersemi_rust_backend
+            from gersemi.__main__ import create_argparser, postprocess_args
+        except ImportError:
+            print("error: gersemi not found. Is it installed?", file=sys.stderr)
             return False
-        except subprocess.CalledProcessError:
+
+        args = ["-i", "--no-color", "-q", "--workers", str(self.jobs)]
+
+        # This mirrors gersemi's main(), which exits with its return code.
+        # create_argparser(), postprocess_args(), and gersemi_rust_backend.App
+        # are gersemi internals, so they only work because gersemi is pinned to
+        # 0.28.0 in pyproject.toml. Check them again when bumping the version.
+        try:
+            gersemi_args = create_argparser().parse_args(
+                args + [f.as_posix() for f in filenames]
+            )
+            postprocess_args(gersemi_args)
+            return gersemi_rust_backend.App(gersemi_args).run() == 0
+        except SystemExit as e:
+            return not e.code
+        except Exception as e:
+            print(e, file=sys.stderr)
             return False
-        return True
@@ -9,6 +9,19 @@ class Config:
     # Dict from filepath to file contents
     __config_cache: ClassVar[dict[Path, list[str]]] = {}
 
+    # Set of filepaths known not to exist
+    __missing_files: ClassVar[set[Path]] = set()
+
+    # Dict from directory to nearest .wpiformat and .styleguide files in it or
+    # its parents
+    __directory_cache: ClassVar[dict[Path, tuple[Path | None, Path | None]]] = {}
+
+    # Dict from config filepath to Config object
+    __instances: ClassVar[dict[Path | None, "Config"]] = {}
+
+    # Dict from (directory, filename) to return value of read_file_chain()
+    __chain_cache: ClassVar[dict[tuple[Path, str], list[str]]] = {}
+
     def __init__(self, directory: Path, filename: Path):
         """Constructor for Config object.
 
@@ -23,6 +36,66 @@ class Config:
         self.__generated_exclude_regex = self.regex("generatedFileExclude")
         self.__modifiable_exclude_regex = self.regex("modifiableFileExclude")
 
+    @staticmethod
+    def get(directory: Path) -> "Config":
+        """Returns Config object for files in the given directory.
+
+        The nearest .wpiformat file in the directory or its parents is used. If
+        there isn't one, the nearest deprecated .styleguide file is used
+        instead. Lookups are memoized per directory, including ones that found
+        nothing, and Config objects are shared between directories using the
+        same config file.
+
+        Keyword arguments:
+        directory -- directory in which to start search for config file
+        """
+        # TODO: Remove handling for deprecated .styleguide file
+        wpiformat_file, styleguide_file = Config.__find_config_files(directory)
+        filepath = wpiformat_file or styleguide_file
+
+        config = Config.__instances.get(filepath)
+        if config is None:
+            if filepath is None:
+                config = Config(directory, Path(".wpiformat"))
+            else:
+                config = Config(filepath.parent, Path(filepath.name))
+            Config.__instances[filepath] = config
+        return config
+
+    @staticmethod
+    def __find_config_files(directory: Path) -> tuple[Path | None, Path | None]:
+        """Returns nearest .wpiformat and .styleguide files.
+
+        Keyword arguments:
+        directory -- directory in which to start search
+        """
+        if (config_files := Config.__directory_cache.get(directory)) is not None:
+            return config_files
+
+        wpiformat_file = directory / ".wpiformat"
+        if not wpiformat_file.is_file():
+            wpiformat_file = None
+        styleguide_file = directory / ".styleguide"
+        if not styleguide_file.is_file():
+            styleguide_file = None
+
+        # The search stops at the repository root. .git files are ignored,
+        # which are created within submodules.
+        if (
+            (wpiformat_file is None or styleguide_file is None)
+            and not (directory / ".git").is_dir()
+            and directory.parent != directory
+        ):
+            parent_wpiformat_file, parent_styleguide_file = Config.__find_config_files(
+                directory.parent
+            )
+            wpiformat_file = wpiformat_file or parent_wpiformat_file
+            styleguide_file = styleguide_file or parent_styleguide_file
+
+        config_files = (wpiformat_file, styleguide_file)
+        Config.__directory_cache[directory] = config_files
+        return config_files
+
     @staticmethod
     def read_file(directory: Path, filename: Path) -> tuple[Path, list[str]]:
         """Find file and return contents.
@@ -39,6 +112,11 @@ class Config:
         """
         for parent in (directory / filename).parents:
             filepath = parent / filename
+            if filepath in Config.__missing_files:
+                if (parent / ".git").is_dir():
+                    raise OSError
+                continue
+
             try:
                 # If filepath in config cache, return cached version instead
                 if config_file := Config.__config_cache.get(filepath):
@@ -56,11 +134,39 @@ class Config:
 
                 return filepath, contents
             except OSError:
+                Config.__missing_files.add(filepath)
+
                 # .git files are ignored, which are created within submodules
                 if (parent / ".git").is_dir():
                     raise
         raise OSError
 
+    @staticmethod
+    def read_file_chain(directory: Path, filename: str) -> list[str]:
+        """Returns names and contents of files with the given name in a
+        directory and all its parents.
+
+        This is for config files which are applied on top of the ones in parent
+        directories (e.g., CPPLINT.cfg).
+
+        Keyword arguments:
+        directory -- directory
+        filename -- filename
+        """
+        if (contents := Config.__chain_cache.get((directory, filename))) is None:
+            contents = []
+            if directory.parent != directory:
+                contents += Config.read_file_chain(directory.parent, filename)
+
+            filepath = directory / filename
+            if filepath.is_file():
+                contents += [
+                    filepath.as_posix(),
+                    filepath.read_text(encoding="utf-8", errors="replace"),
+                ]
+            Config.__chain_cache[(directory, filename)] = contents
+        return contents
+
     def group(self, group_name: str) -> list[str]:
         """Returns value from config dictionary given key string.
 
@@ -0,0 +1,250 @@
+"""Maps C and C++ files to the files they include.
+
+The graph is built by scanning #include directives instead of running the
+preprocessor, so it over-approximates conditional includes. Include names are
+resolved against the includer's directory first, then by path suffix against
+every scanned file. Names which don't resolve to a scanned file (e.g., system
+headers or headers generated in the build tree) can be searched for in include
+directories with get_external_includes().
+"""
+
+import os
+import re
+from pathlib import Path
+from typing import ClassVar
+
+from wpiformat.cache import Cache
+
+
+class IncludeGraph:
+    __include_regex: ClassVar[re.Pattern] = re.compile(
+        r"^[ \t]*#[ \t]*include[ \t]*[<\"]([^>\"\n]+)[>\"]", re.MULTILINE
+    )
+
+    def __init__(self, filenames: list[Path], cache: Cache | None = None):
+        """Constructor for IncludeGraph object.
+
+        Keyword arguments:
+        filenames -- list of files to scan
+        cache -- include name cache or None if caching is disabled. Entries are
+                 keyed on each file's modification time and size.
+        """
+        # Dict from file to files it includes
+        self.includes: dict[Path, set[Path]] = {}
+
+        # Dict from file to files which include it
+        self.includers: dict[Path, set[Path]] = {}
+
+        # Dict from file to include names which didn't resolve to a scanned file
+        self.unresolved: dict[Path, set[str]] = {}
+
+        self.__cache = cache
+
+        # Dict from (search directories, include name) to the header found
+        self.__search_results: dict[tuple[tuple[Path, ...], str], Path | None] = {}
+
+        files_by_name: dict[str, list[Path]] = {}
+        for filename in filenames:
+            files_by_name.setdefault(filename.name, []).append(filename)
+        file_set = set(filenames)
+
+        for filename in filenames:
+            includes = set()
+            unresolved = set()
+            for name in self.__scan(filename, cache):
+                name = name.replace("\\", "/")
+
+                # Includes relative to the includer take precedence
+                relative = Path(os.path.normpath(filename.parent / name))
+                if relative in file_set:
+                    includes.add(relative)
+                    continue
+
+                suffix = "/" + "/".join(
+                    part for part in name.split("/") if part not in ("", ".", "..")
+                )
+                candidates = [
+                    candidate
+                    for candidate in files_by_name.get(Path(name).name, [])
+                    if candidate.as_posix().endswith(suffix)
+                ]
+                if candidates:
+                    includes.update(candidates)
+                else:
+                    unresolved.add(name)
+
+            self.includes[filename] = includes
+            if unresolved:
+                self.unresolved[filename] = unresolved
+            for include in includes:
+                self.includers.setdefault(include, set()).add(filename)
+
+    def __scan(self, filename: Path, cache: Cache | None) -> list[str]:
+        """Returns names in file's #include directives.
+
+        Keyword arguments:
+        filename -- filename
+        cache -- include name cache or None if caching is disabled
+        """
+        try:
+            stat = filename.stat()
+        except OSError:
+            return []
+
+        key = filename.as_posix()
+        entry = cache.get(key) if cache else None
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[2]
+
+        try:
+            lines = filename.read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            return []
+        names = self.__include_regex.findall(lines)
+
+        if cache:
+            cache.set(key, [stat.st_mtime_ns, stat.st_size, names])
+        return names
+
+    def get_transitive_includes(self, filename: Path) -> set[Path]:
+        """Returns files which a file includes directly or indirectly.
+
+        Keyword arguments:
+        filename -- filename
+        """
+        includes = set()
+        stack = [filename]
+        while stack:
+            for include in self.includes.get(stack.pop(), ()):
+                if include not in includes:
+                    includes.add(include)
+                    stack.append(include)
+        return includes
+
+    def get_external_includes(
+        self, filename: Path, include_dirs: list[Path]
+    ) -> set[tuple[str, Path | None]]:
+        """Returns headers outside the graph which a file includes directly or
+        indirectly.
+
+        Include names which didn't resolve to a scanned file are searched for in
+        the includer's directory, then in the include directories. Headers found
+        this way are scanned for their own includes too.
+
+        Keyword arguments:
+        filename -- filename
+        include_dirs -- directories searched for include names (e.g., from the
+                        file's -I flags)
+
+        Returns set of (include name, header or None if it wasn't found)
+        tuples.
+        """
+        stack = [
+            (includer, name)
+            for includer in {filename} | self.get_transitive_includes(filename)
+            for name in self.unresolved.get(includer, ())
+        ]
+
+        headers = set()
+        visited = set()
+        while stack:
+            includer, name = stack.pop()
+            search_dirs = (includer.parent, *include_dirs)
+            if (search_dirs, name) in visited:
+                continue
+            visited.add((search_dirs, name))
+
+            header = self.__search(search_dirs, name)
+            headers.add((name, header))
+            if header is None:
+                continue
+
+            if header in self.includes:
+                # Scanned files are followed through the graph
+                for include in {header} | self.get_transitive_includes(header):
+                    headers.add((include.as_posix(), include))
+                    stack += [
+                        (include, include_name)
+                        for include_name in self.unresolved.get(include, ())
+                    ]
+            else:
+                stack += [
+                    (header, include_name.replace("\\", "/"))
+                    for include_name in self.__scan(header, self.__cache)
+                ]
+
+        return headers
+
+    def __search(self, search_dirs: tuple[Path, ...], name: str) -> Path | None:
+        """Returns first header with the given include name in the search
+        directories or None if there isn't one.
+
+        Keyword arguments:
+        search_dirs -- directories to search in order
+        name -- include name
+        """
+        key = (search_dirs, name)
+        if key not in self.__search_results:
+            self.__search_results[key] = next(
+                (
+                    header
+                    for directory in search_dirs
+                    if (header := Path(os.path.normpath(directory / name))).is_file()
+                ),
+                None,
+            )
+        return self.__search_results[key]
+
+    def get_transitive_includers(self, filename: Path) -> set[Path]:
+        """Returns files which include a file directly or indirectly.
+
+        Keyword arguments:
+        filename -- filename
+        """
+        includers = set()
+        stack = [filename]
+        while stack:
+            for includer in self.includers.get(stack.pop(), ()):
+                if includer not in includers:
+                    includers.add(includer)
+                    stack.append(includer)
+        return includers
+
+    def get_covering_sources(
+        self, headers: list[Path], sources: set[Path]
+    ) -> tuple[set[Path], set[Path]]:
+        """Returns small set of source files which include the given headers.
+
+        Source files are chosen greedily by how many of the remaining headers
+        they include, so each header is analyzed in at least one translation
+        unit without checking every file that includes it.
+
+        Keyword arguments:
+        headers -- list of headers
+        sources -- set of source files which can be checked (e.g., ones with
+                   compile commands)
+
+        Returns tuple of chosen source files and headers no source file
+        includes.
+        """
+        # Dict from source file to headers it includes
+        coverage: dict[Path, set[Path]] = {}
+        uncovered = set()
+        for header in headers:
+            includers = self.get_transitive_includers(header) & sources
+            if not includers:
+                uncovered.add(header)
+            for includer in includers:
+                coverage.setdefault(includer, set()).add(header)
+
+        chosen = set()
+        remaining = set(headers) - uncovered
+        while remaining:
+            # Ties are broken by path so the choice is deterministic
+            source = max(
+                sorted(coverage), key=lambda source: len(coverage[source] & remaining)
+            )
+            chosen.add(source)
+            remaining -= coverage.pop(source)
+
+        return chosen, uncovered
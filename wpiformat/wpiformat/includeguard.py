@@ -7,6 +7,7 @@ Runs on: C header, C++ header
 import re
 from enum import Enum
 from pathlib import Path
+from typing import ClassVar
 
 from wpiformat.config import Config
 from wpiformat.task import PipelineTask
@@ -19,6 +20,9 @@ class State(Enum):
 
 
 class IncludeGuard(PipelineTask):
+    __ifndef_regex: ClassVar[re.Pattern] = re.compile(r"#ifndef \w+", re.ASCII)
+    __define_regex: ClassVar[re.Pattern] = re.compile(r"#define \w+", re.ASCII)
+
     @staticmethod
     def should_process_file(config_file: Config, filename: Path):
         return config_file.is_header_file(filename)
@@ -31,8 +35,6 @@ class IncludeGuard(PipelineTask):
         output_list = lines_list
 
         state = State.FINDING_IFNDEF
-        ifndef_regex = re.compile(r"#ifndef \w+", re.ASCII)
-        define_regex = re.compile(r"#define \w+", re.ASCII)
 
         if_preproc_count = 0
         for i in range(len(lines_list)):
@@ -43,8 +45,10 @@ class IncludeGuard(PipelineTask):
                     state = State.FINDING_ENDIF
 
                     guard = self.make_include_guard(config_file, filename)
-                    output_list[i] = ifndef_regex.sub("#ifndef " + guard, lines_list[i])
-                    output_list[i + 1] = define_regex.sub(
+                    output_list[i] = self.__ifndef_regex.sub(
+                        "#ifndef " + guard, lines_list[i]
+                    )
+                    output_list[i + 1] = self.__define_regex.sub(
                         "#define " + guard, lines_list[i + 1]
                     )
                     if_preproc_count += 1
@@ -6,60 +6,33 @@ Runs on: Java
 
 import re
 from pathlib import Path
+from typing import ClassVar
 
 from wpiformat.config import Config
-from wpiformat.task import PipelineTask
+from wpiformat.task import PipelineEditTask
+from wpiformat.tokenizer import Tokenizer
 
 
-class JavaClass(PipelineTask):
+class JavaClass(PipelineEditTask):
+    # Dictionary from line separator to regex matching an opening brace followed
+    # by two or more line separators
+    __token_regexes: ClassVar[dict[str, re.Pattern]] = {
+        linesep: re.compile(r"{" + linesep + r"(?P<extra>(" + linesep + r")+)")
+        for linesep in ["\n", "\r\n"]
+    }
+
     @staticmethod
     def should_process_file(config_file: Config, filename: Path) -> bool:
         return filename.suffix == ".java"
 
-    def run_pipeline(
+    def run_pipeline_edits(
         self, config_file: Config, filename: Path, lines: str
-    ) -> tuple[str, bool]:
+    ) -> tuple[list[tuple[int, int, str]], bool]:
         linesep = super().get_linesep(lines)
 
-        output = ""
-        pos = 0
-
-        # Match two or more line separators
-        token_str = (
-            r"/\*|\*/|//|"
-            + linesep
-            + r"|{"
-            + linesep
-            + r"(?P<extra>("
-            + linesep
-            + r")+)"
-        )
-        token_regex = re.compile(token_str)
-
-        in_multicomment = False
-        in_comment = False
-
-        for match in token_regex.finditer(lines):
-            token = match.group()
-
-            if token == "/*":
-                in_multicomment = True
-            elif token == "*/":
-                in_multicomment = False
-                in_comment = False
-            elif token == "//":
-                in_comment = True
-            elif token == linesep:
-                in_comment = False
-            elif not in_multicomment and not in_comment:
-                # Otherwise, the token is a class
-
-                # Removes extra line separators
-                output += lines[pos : match.span("extra")[0]]
-                pos = match.span()[1]
-
-        # Write rest of file if it wasn't all processed
-        if pos < len(lines):
-            output += lines[pos:]
-
-        return output, True
+        # Removes extra line separators
+        token_regex = self.__token_regexes[linesep]
+        return [
+            (match.start("extra"), match.end(), "")
+            for match in Tokenizer.get(lines).code_matches(token_regex)
+        ], True
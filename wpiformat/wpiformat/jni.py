@@ -24,12 +24,33 @@ Runs on: C++ source
 
 import re
 from pathlib import Path
+from typing import ClassVar
 
 from wpiformat.config import Config
-from wpiformat.task import PipelineTask
+from wpiformat.task import PipelineEditTask
+
+
+class Jni(PipelineEditTask):
+    __regex_sig: ClassVar[re.Pattern] = re.compile(
+        r"(/\*(?>(.|\n)*?\*/)\s+)?"
+        + r"JNIEXPORT\s+(?P<ret>\w+)\s+JNICALL\s+"
+        + r"(?P<func>Java_\w+)\s*\(\s*"
+        + r"(?P<env_type>JNIEnv\s*\*\s*)"
+        + r"(?P<env_name>\w+)?,\s*"
+        + r"(?P<param_type>jclass|jobject)\s*(?P<param_name>\w*)?"
+    )
+
+    __regex_func: ClassVar[re.Pattern] = re.compile(
+        r"Java_(?P<class>\w+)_(?P<method>[^_]+)$"
+    )
+
+    # Matches a comma followed by the type, an optional variable name, and an
+    # optional closing parenthesis
+    __regex_arg: ClassVar[re.Pattern] = re.compile(
+        r", \s* (?P<arg>(?P<arg_type>[\w\*]+)(\s+ \w+)?)|\)\s*" r"(?P<trailing>{|;)",
+        re.VERBOSE,
+    )
 
-
-class Jni(PipelineTask):
     @staticmethod
     def should_process_file(config_file: Config, filename: Path) -> bool:
         return config_file.is_cpp_src_file(filename)
@@ -65,40 +86,16 @@ class Jni(PipelineTask):
         else:
             return ret + "?"
 
-    def run_pipeline(
+    def run_pipeline_edits(
         self, config_file: Config, filename: Path, lines: str
-    ) -> tuple[str, bool]:
+    ) -> tuple[list[tuple[int, int, str]], bool]:
         linesep = super().get_linesep(lines)
 
-        regex_str_sig = (
-            r"(/\*(?>(.|\n)*?\*/)\s+)?"
-            + r"JNIEXPORT\s+(?P<ret>\w+)\s+JNICALL\s+"
-            + r"(?P<func>Java_\w+)\s*\(\s*"
-            + r"(?P<env_type>JNIEnv\s*\*\s*)"
-            + r"(?P<env_name>\w+)?,\s*"
-            + r"(?P<param_type>jclass|jobject)\s*(?P<param_name>\w*)?"
-        )
-        regex_sig = re.compile(regex_str_sig)
-
-        regex_str_func = r"Java_(?P<class>\w+)_(?P<method>[^_]+)$"
-        regex_func = re.compile(regex_str_func)
-
-        # Matches a comma followed by the type, an optional variable name, and
-        # an optional closing parenthesis
-        regex_str_arg = (
-            r", \s* (?P<arg>(?P<arg_type>[\w\*]+)(\s+ \w+)?)|\)\s*" r"(?P<trailing>{|;)"
-        )
-        regex_arg = re.compile(regex_str_arg, re.VERBOSE)
-
-        output = ""
-        pos = 0
-        for match_sig in regex_sig.finditer(lines):
+        edits = []
+        for match_sig in self.__regex_sig.finditer(lines):
             comment = ""
             signature = ""
 
-            if match_sig.start() > 0:
-                output += lines[pos : match_sig.start()]
-
             # Add JNI-specific args
             jni_args = "  ("
             if match_sig.group("env_type"):
@@ -111,9 +108,9 @@ class Jni(PipelineTask):
 
             # Write JNI function comment. Splitting at "__" removes overload
             # annotation from method comment
-            match = regex_func.search(match_sig.group("func").split("__")[0])
+            match = self.__regex_func.search(match_sig.group("func").split("__")[0])
             if not match:
-                return lines, False
+                return [], False
             comment += f"""/*
  * Class:     {match.group("class")}
  * Method:    {match.group("method")}
@@ -125,7 +122,7 @@ class Jni(PipelineTask):
 
             # Add other args
             line_length = len(jni_args)
-            for match_arg in regex_arg.finditer(lines[match_sig.end() :]):
+            for match_arg in self.__regex_arg.finditer(lines, match_sig.end()):
                 if ")" in match_arg.group():
                     break
                 # If args going past 80 characters
@@ -151,15 +148,10 @@ class Jni(PipelineTask):
             else:
                 signature += ");"
 
-            output += comment + signature
+            edit = (match_sig.start(), match_arg.end(), comment + signature)
 
-            pos = match_sig.end() + match_arg.end()
+            # Skip edits which wouldn't change anything
+            if lines[edit[0] : edit[1]] != edit[2]:
+                edits.append(edit)
 
-        # Write rest of file
-        if pos < len(lines):
-            output += lines[pos:]
-
-        if output == "":
-            return lines, True
-        else:
-            return output, True
+        return edits, True
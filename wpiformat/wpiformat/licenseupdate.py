@@ -4,16 +4,101 @@ This task updates the license header at the top of the file.
 Runs on: C, C++, Java
 """
 
+import os
 import re
 import subprocess
 from datetime import date
 from pathlib import Path
+from typing import ClassVar
 
 from wpiformat.config import Config
 from wpiformat.task import PipelineTask
 
 
 class LicenseUpdate(PipelineTask):
+    # Regex for tokenizing on comment boundaries
+    __token_regex: ClassVar[re.Pattern] = re.compile(r"/\*|\*/|^//")
+
+    __year_regex: ClassVar[re.Pattern] = re.compile(r"Copyright \(c\)(?>.*?\s(20..))")
+
+    def __init__(self, last_years: dict[str, str] | None = None):
+        """Constructor for LicenseUpdate task.
+
+        Keyword arguments:
+        last_years -- dictionary from filepath relative to the repository root
+                      to the year the file was last modified, as returned by
+                      get_last_years(). If None, Git is queried for each file.
+        """
+        super().__init__()
+
+        self.last_years = last_years
+
+        # Dictionary from license template and line separator to the license
+        # template converted to a regex
+        self.__license_regexes: dict[tuple[tuple[str, ...], str], re.Pattern] = {}
+
+    @staticmethod
+    def get_last_years(repo_root: Path, filenames: list[Path]) -> dict[str, str]:
+        """Returns the year each file was last modified.
+
+        One "git status" call finds files with uncommitted changes, which were
+        last modified this year. One "git log" walk finds the year the other
+        files were last committed. The walk stops once every file was found.
+
+        Keyword arguments:
+        repo_root -- Git repository root
+        filenames -- list of filenames
+
+        Returns dictionary from filepath relative to the repository root to
+        year. Files which haven't been committed yet may be missing from it.
+        """
+        current_year = str(date.today().year)
+        last_years = {}
+
+        for name in PipelineTask.get_uncommitted_files(repo_root):
+            last_years[name] = current_year
+
+        remaining = set()
+        for filename in filenames:
+            try:
+                name = filename.relative_to(repo_root).as_posix()
+            except ValueError:
+                continue
+            if name not in last_years:
+                remaining.add(name)
+        if not remaining:
+            return last_years
+
+        # Committer date is used instead of author date (the one shown by "git
+        # log") because the year the file was last modified in the history
+        # should be used. Author dates can be older than this or even out of
+        # order in the log.
+        #
+        # With -z, each commit is printed as "\x01<date>\0\n" followed by
+        # the names of the files it modified, each terminated by "\0".
+        with subprocess.Popen(
+            ["git", "log", "-z", "--name-only", "--no-renames", "--format=%x01%cs"],
+            cwd=repo_root,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        ) as proc:
+            year = ""
+            remainder = b""
+            while remaining and (chunk := proc.stdout.read(64 * 1024)):
+                *entries, remainder = (remainder + chunk).split(b"\0")
+                for entry in entries:
+                    entry = entry.lstrip(b"\n")
+                    if entry.startswith(b"\x01"):
+                        year = entry[1:5].decode()
+                    elif (name := os.fsdecode(entry)) in remaining:
+                        # The log is newest first, so the first commit that
+                        # modified a file is the most recent one
+                        last_years[name] = year
+                        remaining.remove(name)
+            proc.kill()
+
+        return last_years
+
     @staticmethod
     def should_process_file(config_file: Config, filename: Path) -> bool:
         license_regex = config_file.regex("licenseUpdateExclude")
@@ -40,18 +125,22 @@ class LicenseUpdate(PipelineTask):
         """
         linesep = super().get_linesep(lines)
 
-        # Convert the license template to a regex
-        license_rgxstr = "^" + linesep.join(license_template)
-        license_rgxstr = (
-            license_rgxstr.replace("*", r"\*")
-            .replace(".", r"\.")
-            .replace("(", r"\(")
-            .replace(")", r"\)")
-            .replace("{year}", r"(?P<year>[0-9]+)(-[0-9]+)?")
-            .replace("{padding}", "[ ]*")
-            .replace("{filename}", "")
-        )
-        license_rgx = re.compile(license_rgxstr, re.MULTILINE)
+        # Convert the license template to a regex. Every file with the same
+        # template and line separator shares the regex.
+        key = (tuple(license_template), linesep)
+        if not (license_rgx := self.__license_regexes.get(key)):
+            license_rgxstr = "^" + linesep.join(license_template)
+            license_rgxstr = (
+                license_rgxstr.replace("*", r"\*")
+                .replace(".", r"\.")
+                .replace("(", r"\(")
+                .replace(")", r"\)")
+                .replace("{year}", r"(?P<year>[0-9]+)(-[0-9]+)?")
+                .replace("{padding}", "[ ]*")
+                .replace("{filename}", "")
+            )
+            license_rgx = re.compile(license_rgxstr, re.MULTILINE)
+            self.__license_regexes[key] = license_rgx
 
         first_year = last_year
 
@@ -90,9 +179,6 @@ class LicenseUpdate(PipelineTask):
         first_comment_is_license = False
         license_end = 0
 
-        # Regex for tokenizing on comment boundaries
-        token_regex = re.compile(r"/\*|\*/|^//")
-
         in_multiline_comment = False
         for line in stripped_lines:
             # If part of comment contains "Copyright (c)", comment is
@@ -101,7 +187,7 @@ class LicenseUpdate(PipelineTask):
                 first_comment_is_license = True
 
             line_has_comment = False
-            for match in token_regex.finditer(line):
+            for match in self.__token_regex.finditer(line):
                 # If any comment token was matched, the line has a comment
                 line_has_comment = True
 
@@ -125,9 +211,8 @@ class LicenseUpdate(PipelineTask):
                 linesep + linesep.join(stripped_lines[license_end:]).lstrip()
             )
 
-            year_regex = re.compile(r"Copyright \(c\)(?>.*?\s(20..))")
             for line in license_part.split(linesep):
-                match = year_regex.search(line)
+                match = self.__year_regex.search(line)
                 # If license contains copyright pattern, extract the first year
                 if match:
                     first_year = match.group(1)
@@ -152,20 +237,28 @@ class LicenseUpdate(PipelineTask):
                 filename.parent, Path(".styleguide-license")
             )
 
-        # Get year when file was most recently modified in Git history
-        #
-        # Committer date is used instead of author date (the one shown by "git
-        # log") because the year the file was last modified in the history
-        # should be used. Author dates can be older than this or even out of
-        # order in the log.
-        last_year = subprocess.check_output(
-            ["git", "log", "-n", "1", "--format=%ci", "--", filename]
-        ).decode()[:4]
-
-        # Check if file has uncomitted changes in the working directory
-        has_uncommitted_changes = subprocess.run(
-            ["git", "diff-index", "--quiet", "HEAD", "--", filename], check=False
-        ).returncode
+        if self.last_years is not None:
+            # Files with uncommitted changes are already mapped to the current
+            # year
+            last_year = self.last_years.get(
+                filename.relative_to(super().get_repo_root()).as_posix(), ""
+            )
+            has_uncommitted_changes = False
+        else:
+            # Get year when file was most recently modified in Git history
+            #
+            # Committer date is used instead of author date (the one shown by
+            # "git log") because the year the file was last modified in the
+            # history should be used. Author dates can be older than this or
+            # even out of order in the log.
+            last_year = subprocess.check_output(
+                ["git", "log", "-n", "1", "--format=%ci", "--", filename]
+            ).decode()[:4]
+
+            # Check if file has uncomitted changes in the working directory
+            has_uncommitted_changes = subprocess.run(
+                ["git", "diff-index", "--quiet", "HEAD", "--", filename], check=False
+            ).returncode
 
         # If file hasn't been committed yet or has changes in the working
         # directory, use current calendar year as end of copyright year range
@@ -0,0 +1,73 @@
+"""Maps indices into file contents to line numbers.
+
+Tasks which report line numbers share one LineIndex per file contents instead
+of counting line separators or splitting the file for each report.
+"""
+
+from bisect import bisect_right
+from typing import ClassVar
+
+
+class LineIndex:
+    # Most recently indexed file contents and the LineIndex for them
+    __last_line_index: ClassVar["LineIndex | None"] = None
+
+    def __init__(self, lines: str):
+        """Constructor for LineIndex object.
+
+        The table of line start indices is built on first use, so files
+        without anything to report don't pay for it.
+
+        Keyword arguments:
+        lines -- file contents
+        """
+        self.lines = lines
+        self.__line_starts: list[int] | None = None
+
+    @staticmethod
+    def get(lines: str) -> "LineIndex":
+        """Returns LineIndex for the given file contents.
+
+        The most recent LineIndex is reused if the contents match.
+
+        Keyword arguments:
+        lines -- file contents
+        """
+        line_index = LineIndex.__last_line_index
+        if line_index is None or line_index.lines != lines:
+            line_index = LineIndex(lines)
+            LineIndex.__last_line_index = line_index
+        return line_index
+
+    def __get_line_starts(self) -> list[int]:
+        """Returns list of indices at which each line starts."""
+        if self.__line_starts is None:
+            line_starts = [0]
+            pos = self.lines.find("\n")
+            while pos != -1:
+                line_starts.append(pos + 1)
+                pos = self.lines.find("\n", pos + 1)
+            self.__line_starts = line_starts
+        return self.__line_starts
+
+    def line_number(self, pos: int) -> int:
+        """Returns one-based line number of the line containing an index.
+
+        Keyword arguments:
+        pos -- index into file contents
+        """
+        return bisect_right(self.__get_line_starts(), pos)
+
+    def line(self, linenum: int) -> str:
+        """Returns line without its line separator.
+
+        Keyword arguments:
+        linenum -- one-based line number
+        """
+        line_starts = self.__get_line_starts()
+        start = line_starts[linenum - 1]
+        if linenum < len(line_starts):
+            end = line_starts[linenum]
+        else:
+            end = len(self.lines)
+        return self.lines[start:end].rstrip("\r\n")
@@ -4,76 +4,197 @@ This task runs cpplint.py.
 Runs on: C++
 """
 
-import os
+import io
 import sys
-from contextlib import redirect_stdout
+from contextlib import redirect_stderr
 from pathlib import Path
+from typing import ClassVar
 
 import cpplint
 
+from wpiformat.cache import Cache, hash_contents
 from wpiformat.config import Config
-from wpiformat.task import BatchTask
+from wpiformat.task import BatchTask, PipelineTask
 
 
-class Lint(BatchTask):
+class Lint(PipelineTask, BatchTask):
+    in_process = True
+
+    # cpplint categories which aren't checked
+    __exclusion_filters: ClassVar[list[str]] = [
+        "build/c++11",
+        "build/c++17",
+        "build/header_guard",
+        "build/include_order",
+        "build/include_subdir",
+        "build/namespaces",
+        "legal/copyright",
+        "readability/braces",
+        "readability/check",
+        "readability/todo",
+        "runtime/references",
+        "runtime/string",
+        "whitespace/braces",
+        "whitespace/comma",
+        "whitespace/comments",
+        "whitespace/end_of_line",
+        "whitespace/ending_newline",
+        "whitespace/indent",
+        "whitespace/indent_namespace",
+        "whitespace/line_length",
+        "whitespace/newline",
+        "whitespace/operators",
+        "whitespace/parens",
+        "whitespace/semicolon",
+        "whitespace/tab",
+    ]
+
+    def __init__(self, cache: Cache | None = None):
+        """Constructor for Lint task.
+
+        Keyword arguments:
+        cache -- cache of cpplint results or None if caching is disabled. Its
+                 environment must cover the cpplint version.
+        """
+        super().__init__()
+
+        self.cache = cache
+
+        # Header file extensions cpplint is currently configured with
+        self.__header_exts: list[str] | None = None
+
     @staticmethod
     def should_process_file(config_file: Config, filename: Path) -> bool:
         return config_file.is_cpp_file(filename)
 
+    def run_pipeline(
+        self, config_file: Config, filename: Path, lines: str
+    ) -> tuple[str, bool]:
+        return lines, self.__lint(config_file, filename, lines)
+
+    def run_batch(self, config_file: Config, filenames: list[Path]) -> bool:
+        all_success = True
+        for filename in filenames:
+            lines = filename.read_text(encoding="utf-8", errors="replace")
+            all_success &= self.__lint(Config.get(filename.parent), filename, lines)
+        return all_success
+
     @staticmethod
-    def run_batch(config_file: Config, filenames: list[Path]) -> bool:
-        # Prepare arguments to cpplint.py
-        saved_argv = sys.argv
-
-        exclusion_filters = [
-            "build/c++11",
-            "build/c++17",
-            "build/header_guard",
-            "build/include_order",
-            "build/include_subdir",
-            "build/namespaces",
-            "legal/copyright",
-            "readability/braces",
-            "readability/check",
-            "readability/todo",
-            "runtime/references",
-            "runtime/string",
-            "whitespace/braces",
-            "whitespace/comma",
-            "whitespace/comments",
-            "whitespace/end_of_line",
-            "whitespace/ending_newline",
-            "whitespace/indent",
-            "whitespace/indent_namespace",
-            "whitespace/line_length",
-            "whitespace/newline",
-            "whitespace/operators",
-            "whitespace/parens",
-            "whitespace/semicolon",
-            "whitespace/tab",
-        ]
-
-        # Prepare header file extensions
+    def get_header_extensions(config_file: Config) -> list[str]:
+        """Returns header file extensions for cpplint.
+
+        Keyword arguments:
+        config_file -- Config object
+        """
         header_exts = ["hpp"]
         for pattern in config_file.group("cHeaderFileInclude") + config_file.group(
             "cppHeaderFileInclude"
         ):
             basename = Path(pattern).name
             header_exts.append(basename[basename.rfind(".") + 1 :].rstrip("$"))
+        return header_exts
+
+    def __lint(self, config_file: Config, filename: Path, lines: str) -> bool:
+        """Runs cpplint on file contents and prints its errors.
+
+        Files which were linted before with the same contents and configuration
+        aren't linted again, and the errors reported for them are replayed.
+
+        Keyword arguments:
+        config_file -- Config object
+        filename -- filename
+        lines -- file contents
+
+        Returns True if cpplint found no errors.
+        """
+        header_exts = self.get_header_extensions(config_file)
 
-        args = ["cpplint.py", "--filter=-" + ",-".join(exclusion_filters)]
-        args.append("--headers=" + ",".join(header_exts))
-        args.append("--quiet")
-        sys.argv = args + [f.as_posix() for f in filenames]
+        if self.cache:
+            cache_key = hash_contents(
+                filename.as_posix(),
+                lines,
+                *self.__exclusion_filters,
+                *header_exts,
+                *Config.read_file_chain(filename.parent, "CPPLINT.cfg"),
+            )
+            entry = self.cache.get(filename.as_posix())
+            if entry and entry[0] == cache_key:
+                sys.stderr.write(entry[1])
+                return entry[2]
 
-        # Run cpplint.py
+        # cpplint prints errors to stderr, so they're captured for the cache
+        with redirect_stderr(io.StringIO()) as errors:
+            success = self.__run_cpplint(header_exts, filename, lines)
+        sys.stderr.write(errors.getvalue())
+
+        if self.cache:
+            self.cache.set(filename.as_posix(), [cache_key, errors.getvalue(), success])
+
+        return success
+
+    def __run_cpplint(self, header_exts: list[str], filename: Path, lines: str) -> bool:
+        """Runs cpplint on file contents and prints its errors.
+
+        This mirrors cpplint.ProcessFile(), but uses the given contents instead
+        of reading the file.
+
+        Keyword arguments:
+        header_exts -- header file extensions
+        filename -- filename
+        lines -- file contents
+
+        Returns True if cpplint found no errors.
+        """
+        # cpplint is configured through global state, which is only updated
+        # when the header file extensions change
+        if self.__header_exts is None:
+            cpplint._SetQuiet(True)
+            cpplint._SetFilters("-" + ",-".join(self.__exclusion_filters))
+        if header_exts != self.__header_exts:
+            cpplint.ProcessHppHeadersOption(",".join(header_exts))
+            self.__header_exts = header_exts
+
+        name = filename.as_posix()
+        old_errors = cpplint._cpplint_state.error_count
+
+        # CPPLINT.cfg files can modify the filters for this file
+        cpplint._BackupFilters()
         try:
-            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
-                cpplint.main()
-        except SystemExit as e:
-            # Restore original arguments
-            sys.argv = saved_argv
-
-            # Report success if error code is 0 (False)
-            return not e.code
-        return False
+            if not cpplint.ProcessConfigOverrides(name):
+                return True
+
+            # Like cpplint, split on "\n" so the last element is the empty line
+            # after the final newline, and strip trailing "\r" from each line
+            split_lines = lines.split("\n")
+            lf_lines = []
+            crlf_lines = []
+            for linenum in range(len(split_lines) - 1):
+                if split_lines[linenum].endswith("\r"):
+                    split_lines[linenum] = split_lines[linenum].rstrip("\r")
+                    crlf_lines.append(linenum + 1)
+                else:
+                    lf_lines.append(linenum + 1)
+
+            file_extension = name[name.rfind(".") + 1 :]
+            if file_extension not in cpplint.GetAllExtensions():
+                cpplint._cpplint_state.PrintError(
+                    f"Ignoring {name}; not a valid file name ({(', '.join(cpplint.GetAllExtensions()))})\n"
+                )
+                return True
+
+            cpplint.ProcessFileData(name, file_extension, split_lines, cpplint.Error)
+
+            # Mixed line endings are reported on the lines with CR
+            if lf_lines and crlf_lines:
+                for linenum in crlf_lines:
+                    cpplint.Error(
+                        name,
+                        linenum,
+                        "whitespace/newline",
+                        1,
+                        "Unexpected \\r (^M) found; better to use only \\n",
+                    )
+        finally:
+            cpplint._RestoreFilters()
+
+        return cpplint._cpplint_state.error_count == old_errors
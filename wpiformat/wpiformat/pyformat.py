@@ -4,6 +4,7 @@ This task runs ruff.
 Runs on: Python
 """
 
+import os
 import subprocess
 import sys
 from pathlib import Path
@@ -13,12 +14,35 @@ from wpiformat.task import BatchTask
 
 
 class PyFormat(BatchTask):
+    # ruff processes files in parallel itself
+    global_batch = True
+
+    def __init__(self, jobs: int = 1, cache_dir: Path | None = None):
+        """Constructor for PyFormat task.
+
+        Keyword arguments:
+        jobs -- number of threads ruff uses
+        cache_dir -- directory for ruff's cache or None to disable it. Both ruff
+                     steps share it, and it's kept between runs.
+        """
+        super().__init__()
+
+        self.jobs = jobs
+        self.cache_dir = cache_dir
+
     @staticmethod
     def should_process_file(config_file: Config, filename: Path) -> bool:
         return filename.suffix == ".py"
 
-    @staticmethod
-    def run_batch(config_file: Config, filenames: list[Path]) -> bool:
+    def run_batch(self, config_file: Config, filenames: list[Path]) -> bool:
+        # ruff sizes its thread pool from RAYON_NUM_THREADS
+        env = dict(os.environ, RAYON_NUM_THREADS=str(self.jobs))
+
+        if self.cache_dir:
+            cache_args = ["--cache-dir", self.cache_dir.as_posix()]
+        else:
+            cache_args = ["--no-cache"]
+
         try:
             args = [
                 sys.executable,
@@ -27,8 +51,9 @@ class PyFormat(BatchTask):
                 "check",
                 "--fix",
                 "-q",
+                *cache_args,
             ]
-            subprocess.check_call(args + filenames)
+            subprocess.check_call(args + filenames, env=env)
         except FileNotFoundError:
             print("error: ruff not found in PATH. Is it installed?", file=sys.stderr)
             return False
@@ -42,8 +67,9 @@ class PyFormat(BatchTask):
                 "ruff",
                 "format",
                 "-q",
+                *cache_args,
             ]
-            subprocess.check_call(args + filenames)
+            subprocess.check_call(args + filenames, env=env)
         except FileNotFoundError:
             print("error: ruff not found in PATH. Is it installed?", file=sys.stderr)
             return False
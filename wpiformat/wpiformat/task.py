@@ -1,10 +1,16 @@
 """Task base classes."""
 
+import functools
+import os
 import subprocess
+import sys
 from abc import ABCMeta, abstractmethod
+from collections.abc import Generator
 from pathlib import Path
+from typing import ClassVar
 
 from wpiformat.config import Config
+from wpiformat.includegraph import IncludeGraph
 
 
 class Task(metaclass=ABCMeta):
@@ -30,15 +36,96 @@ class Task(metaclass=ABCMeta):
     def get_repo_root() -> Path:
         """Returns the Git repository root as an absolute path.
 
+        The result is memoized per working directory since tasks query it for
+        every file.
+
+        Raises OSError if no repository root was found.
+        """
+        return Task.__get_repo_root(Path.cwd())
+
+    @staticmethod
+    @functools.cache
+    def __get_repo_root(cwd: Path) -> Path:
+        """Returns the Git repository root as an absolute path.
+
+        Keyword arguments:
+        cwd -- working directory from which to search for the repository root
+
         Raises OSError if no repository root was found.
         """
         if output := subprocess.check_output(
-            ["git", "rev-parse", "--show-toplevel"], encoding="utf-8"
+            ["git", "rev-parse", "--show-toplevel"], cwd=cwd, encoding="utf-8"
         ).rstrip():
             return Path(output).resolve()
         else:
             raise OSError("no Git repository root found")
 
+    @staticmethod
+    def get_uncommitted_files(repo_root: Path) -> list[str]:
+        """Returns names of files with staged, unstaged, or untracked changes.
+
+        Keyword arguments:
+        repo_root -- Git repository root
+
+        Returns list of filepaths relative to the repository root.
+        """
+        # Paths in porcelain output are always relative to the repository root
+        output = subprocess.run(
+            [
+                "git",
+                "status",
+                "--porcelain=v1",
+                "-z",
+                "--no-renames",
+                "--untracked-files=all",
+            ],
+            cwd=repo_root,
+            stdout=subprocess.PIPE,
+            check=False,
+        ).stdout
+
+        # Skip the two status characters and the space after them
+        return [os.fsdecode(entry[3:]) for entry in output.split(b"\0") if entry]
+
+    @staticmethod
+    def get_max_args_len() -> int:
+        """Returns conservative estimate for max total length of a subprocess's
+        arguments.
+        """
+        if sys.platform == "win32":
+            # 32767 is from the Win32 docs for CreateProcessA(), but the limit
+            # appears to be lower than that in practice.
+            return int(32767 * 7 / 8)
+
+        # POSIX systems limit the arguments and environment together, so leave
+        # half for the environment
+        try:
+            return os.sysconf("SC_ARG_MAX") // 2
+        except (ValueError, OSError):
+            # POSIX requires at least 4096 bytes
+            return 4096 // 2
+
+    @staticmethod
+    def chunk_args(
+        iterable: list[Path], max_len: int
+    ) -> Generator[list[Path], None, None]:
+        """
+        Yield successive chunks from iterable whose content lengths sum to less
+        than max_len.
+        """
+        out = []
+        size = 0
+        for i, arg in enumerate(iterable):
+            out.append(arg)
+            size += len(arg.as_posix()) + len(" ")
+            if (
+                i == len(iterable) - 1
+                or size + len(iterable[i + 1].as_posix()) > max_len
+            ):
+                yield out
+                out = []
+                size = 0
+
     @staticmethod
     def should_process_file(config_file: Config, filename: Path) -> bool:
         """Returns true if file should be processed by this task.
@@ -53,6 +140,10 @@ class Task(metaclass=ABCMeta):
 
 
 class PipelineTask(Task):
+    # If True, the task is given every file in a chunk at once through
+    # run_pipeline_batch() instead of one file at a time through run_pipeline()
+    batch_pipeline: ClassVar[bool] = False
+
     @abstractmethod
     def run_pipeline(
         self, config_file: Config, filename: Path, lines: str
@@ -71,11 +162,89 @@ class PipelineTask(Task):
         """
         return "", True
 
+    def run_pipeline_batch(
+        self, files: list[tuple[Config, Path, str]]
+    ) -> list[tuple[str, bool]]:
+        """Performs task on multiple files with given lines.
+
+        This function is for tasks which can amortize overhead (e.g., spawning
+        a subprocess) across multiple files. Output printed to stdout isn't
+        attributed to a file, so it isn't replayed on pipeline cache hits.
+
+        Keyword arguments:
+        files -- list of (config_file, filename, lines) tuples
+
+        Returns list of tuples containing processed lines and whether task
+        succeeded in processing each file.
+        """
+        return [
+            self.run_pipeline(config_file, filename, lines)
+            for config_file, filename, lines in files
+        ]
+
+
+class PipelineEditTask(PipelineTask):
+    @abstractmethod
+    def run_pipeline_edits(
+        self, config_file: Config, filename: Path, lines: str
+    ) -> tuple[list[tuple[int, int, str]], bool]:
+        """Finds edits to perform on file with given lines.
+
+        This is an alternative to run_pipeline() for tasks which only modify
+        small parts of a file. The edits are applied in one pass over the file,
+        and the file contents aren't copied at all if there are no edits.
+
+        Keyword arguments:
+        config_file -- Config object
+        filename -- filename
+        lines -- file contents
+
+        Returns tuple containing list of edits and whether task succeeded in
+        processing the file. Each edit is a tuple of the start index, end index,
+        and replacement string for a slice of lines. Edits must be sorted by
+        start index and must not overlap.
+        """
+        return [], True
+
+    def run_pipeline(
+        self, config_file: Config, filename: Path, lines: str
+    ) -> tuple[str, bool]:
+        edits, success = self.run_pipeline_edits(config_file, filename, lines)
+        return self.apply_edits(lines, edits), success
 
-class BatchTask(Task):
     @staticmethod
+    def apply_edits(lines: str, edits: list[tuple[int, int, str]]) -> str:
+        """Returns file contents with edits applied.
+
+        Keyword arguments:
+        lines -- file contents
+        edits -- list of (start, end, replacement) tuples sorted by start index
+        """
+        if not edits:
+            return lines
+
+        output = []
+        pos = 0
+        for start, end, replacement in edits:
+            output.append(lines[pos:start])
+            output.append(replacement)
+            pos = end
+        output.append(lines[pos:])
+        return "".join(output)
+
+
+class BatchTask(Task):
+    # If True, the task parallelizes internally, so it's run once in the main
+    # process on all files instead of once per worker process on a chunk of
+    # them
+    global_batch: ClassVar[bool] = False
+
+    # If True, the task runs in the calling process instead of starting a
+    # subprocess, so its file list isn't split to fit in a command line
+    in_process: ClassVar[bool] = False
+
     @abstractmethod
-    def run_batch(config_file: Config, filenames: list[Path]) -> bool:
+    def run_batch(self, config_file: Config, filenames: list[Path]) -> bool:
         """Performs task on list of files.
 
         This function is for processing multiple files in one task to reduce
@@ -104,3 +273,49 @@ class StandaloneTask(Task):
         Returns True if task succeeded in processing the file.
         """
         return True
+
+    def run_standalone_batch(self, files: list[tuple[Config, Path]]) -> bool:
+        """Performs task on multiple files.
+
+        This function is for tasks which can amortize overhead (e.g., spawning
+        a subprocess) across multiple files.
+
+        Keyword arguments:
+        files -- list of (config_file, filename) tuples
+
+        Returns True if task succeeded in processing the files.
+        """
+        all_success = True
+        for config_file, filename in files:
+            all_success &= self.run_standalone(config_file, filename)
+        return all_success
+
+    def get_cache_key(
+        self, config_file: Config, filename: Path, include_graph: IncludeGraph
+    ) -> str | None:
+        """Returns key for caching the diagnostics the task reports for a file.
+
+        If the key is unchanged in a later run, the task isn't run on the file
+        and the diagnostics reported for it are replayed instead. Only tasks
+        which report everything through pop_diagnostics() can be cached.
+
+        Keyword arguments:
+        config_file -- Config object
+        filename -- filename
+        include_graph -- include graph of the repository's C and C++ files
+
+        Returns None if the task's results for the file can't be cached.
+        """
+        return None
+
+    def pop_diagnostics(self) -> list[tuple[str, int, str, str, str]]:
+        """Returns diagnostics reported since the last call and clears them.
+
+        Tasks which return diagnostics here instead of printing them have them
+        deduplicated across all files (e.g., diagnostics in a header included
+        by several checked files) and printed by the main process.
+
+        Returns list of (filename, line number, check, message, text) tuples.
+        Diagnostics are deduplicated by all but the text.
+        """
+        return []
@@ -0,0 +1,142 @@
+"""Classifies C, C++, and Java source code into code, comment, string, and char
+regions.
+
+Tasks which need to ignore comments and literals share one Tokenizer per file
+contents instead of each lexing the file themselves.
+"""
+
+import re
+from bisect import bisect_right
+from collections.abc import Generator
+from enum import Enum
+from typing import ClassVar
+
+
+class RegionType(Enum):
+    COMMENT = 1
+    STRING = 2
+    CHAR = 3
+
+
+class Tokenizer:
+    # Comment delimiters, escape sequences, quotes, and newlines. Escape
+    # sequences are matched as a whole so their quote isn't treated as a
+    # delimiter.
+    __token_regex: ClassVar[re.Pattern] = re.compile(
+        r"/\*|\*/|//|\\\\|\\\"|\"|\\'|'|\n"
+    )
+
+    # Most recently tokenized file contents and the Tokenizer for them
+    __last_tokenizer: ClassVar["Tokenizer | None"] = None
+
+    def __init__(self, lines: str):
+        """Constructor for Tokenizer object.
+
+        Keyword arguments:
+        lines -- file contents
+        """
+        self.lines = lines
+
+        # List of (start, end, type) tuples for non-code regions in order of
+        # appearance. Regions include their delimiters.
+        self.regions: list[tuple[int, int, RegionType]] = []
+
+        in_multicomment = False
+        in_singlecomment = False
+        in_string = False
+        in_char = False
+        start = 0
+        for match in self.__token_regex.finditer(lines):
+            token = match.group()
+
+            if in_multicomment:
+                if token == "*/":
+                    in_multicomment = False
+                    self.regions.append((start, match.end(), RegionType.COMMENT))
+            elif in_singlecomment:
+                if token == "\n":
+                    in_singlecomment = False
+                    self.regions.append((start, match.start(), RegionType.COMMENT))
+            elif in_string:
+                if token == '"':
+                    in_string = False
+                    self.regions.append((start, match.end(), RegionType.STRING))
+            elif in_char:
+                if token == "'":
+                    in_char = False
+                    self.regions.append((start, match.end(), RegionType.CHAR))
+            elif token == "/*":
+                in_multicomment = True
+                start = match.start()
+            elif token == "//":
+                in_singlecomment = True
+                start = match.start()
+            elif token == '"':
+                in_string = True
+                start = match.start()
+            elif token == "'" and not self.is_quote_in_number(lines, match.start()):
+                in_char = True
+                start = match.start()
+
+        # Unterminated regions extend to the end of the file
+        if in_multicomment or in_singlecomment:
+            self.regions.append((start, len(lines), RegionType.COMMENT))
+        elif in_string:
+            self.regions.append((start, len(lines), RegionType.STRING))
+        elif in_char:
+            self.regions.append((start, len(lines), RegionType.CHAR))
+
+        self.__region_starts = [region[0] for region in self.regions]
+
+    @staticmethod
+    def get(lines: str) -> "Tokenizer":
+        """Returns Tokenizer for the given file contents.
+
+        Tasks in a pipeline which don't modify the file pass the same contents
+        to the next task, so the most recent Tokenizer is reused if the contents
+        match.
+
+        Keyword arguments:
+        lines -- file contents
+        """
+        tokenizer = Tokenizer.__last_tokenizer
+        if tokenizer is None or tokenizer.lines != lines:
+            tokenizer = Tokenizer(lines)
+            Tokenizer.__last_tokenizer = tokenizer
+        return tokenizer
+
+    @staticmethod
+    def is_quote_in_number(lines: str, i: int) -> bool:
+        """Returns True if single quote is a digit separator (e.g., 1'000).
+
+        Keyword arguments:
+        lines -- file contents
+        i -- index of single quote
+        """
+        if i == 0:
+            return False
+        c = lines[i - 1]
+        return (
+            ord("0") <= ord(c) <= ord("9")
+            or ord("A") <= ord(c) <= ord("F")
+            or ord("a") <= ord(c) <= ord("f")
+        )
+
+    def in_code(self, pos: int) -> bool:
+        """Returns True if position isn't in a comment, string, or char.
+
+        Keyword arguments:
+        pos -- index into file contents
+        """
+        i = bisect_right(self.__region_starts, pos) - 1
+        return i < 0 or pos >= self.regions[i][1]
+
+    def code_matches(self, regex: re.Pattern) -> Generator[re.Match, None, None]:
+        """Yields matches of regex which start in code.
+
+        Keyword arguments:
+        regex -- compiled regex
+        """
+        for match in regex.finditer(self.lines):
+            if self.in_code(match.start()):
+                yield match
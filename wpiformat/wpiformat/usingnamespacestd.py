@@ -6,12 +6,20 @@ Runs on: C++
 
 import re
 from pathlib import Path
+from typing import ClassVar
 
 from wpiformat.config import Config
+from wpiformat.lineindex import LineIndex
 from wpiformat.task import PipelineTask
 
 
 class UsingNamespaceStd(PipelineTask):
+    # Find instances of "using namespace std;" or subnamespaces of "std", but
+    # not namespaces for literals or placeholders.
+    __using_regex: ClassVar[re.Pattern] = re.compile(
+        r"using\s+namespace\s+std(;|::(?!(chrono_|string_|string_view_)?literals|placeholders))"
+    )
+
     @staticmethod
     def should_process_file(config_file: Config, filename: Path) -> bool:
         return config_file.is_cpp_file(filename)
@@ -19,16 +27,8 @@ class UsingNamespaceStd(PipelineTask):
     def run_pipeline(
         self, config_file: Config, filename: Path, lines: str
     ) -> tuple[str, bool]:
-        linesep = super().get_linesep(lines)
-
-        # Find instances of "using namespace std;" or subnamespaces of "std",
-        # but not namespaces for literals or placeholders.
-        using_regex = re.compile(
-            r"using\s+namespace\s+std(;|::(?!(chrono_|string_|string_view_)?literals|placeholders))"
-        )
-
-        for match in using_regex.finditer(lines):
-            linenum = lines.count(linesep, 0, match.start()) + 1
+        for match in self.__using_regex.finditer(lines):
+            linenum = LineIndex.get(lines).line_number(match.start())
             print(
                 f'warning: {filename}: {linenum}: avoid "using namespace std;" in production software. While it is used in introductory C++, it pollutes the global namespace with standard library symbols. Be more specific and use "using std::thing;" instead.'
             )